@@ -38,6 +38,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'loans.middleware.QueryCountMiddleware',
+    'loans.middleware.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'credit_system.urls'
@@ -69,6 +71,21 @@ DATABASES = {
     'default': dj_database_url.parse(DATABASE_URL)
 }
 
+# Opt-in customer sharding: a comma-separated list of database URLs. Each one
+# becomes a 'shard_<n>' database holding the customers (and their loans) that
+# LOAN_SHARD_STRATEGY assigns to it; 'modulo' spreads customer IDs by
+# customer_id % shards, 'range' puts each block of LOAN_SHARD_RANGE_SIZE IDs
+# on the next shard (the last shard takes the rest). Everything else stays
+# in the default database, which also allocates the global IDs.
+LOAN_SHARDS = [url.strip() for url in os.environ.get('LOAN_SHARDS', '').split(',') if url.strip()]
+LOAN_SHARD_STRATEGY = os.environ.get('LOAN_SHARD_STRATEGY', 'modulo')
+LOAN_SHARD_RANGE_SIZE = int(os.environ.get('LOAN_SHARD_RANGE_SIZE', 1000000))
+
+for index, shard_url in enumerate(LOAN_SHARDS):
+    DATABASES[f'shard_{index}'] = dj_database_url.parse(shard_url)
+
+DATABASE_ROUTERS = ['loans.sharding.CustomerShardRouter'] if LOAN_SHARDS else []
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -117,6 +134,58 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Enqueue loans.tasks.load_initial_data after every `migrate` (off by default;
+# use `manage.py load_initial_data` to load the Excel files explicitly)
+LOAD_INITIAL_DATA_ON_MIGRATE = os.environ.get('LOAD_INITIAL_DATA_ON_MIGRATE', 'false').lower() == 'true'
+
+# PostgreSQL declarative partitioning of loans_loan by start_date year (see loans/partitioning.py).
+# Applied by migration 0005 when enabled at migrate time, or later with
+# `manage.py create_loan_partitions --convert`. Ignored on other databases.
+LOAN_PARTITIONING = os.environ.get('LOAN_PARTITIONING', 'false').lower() == 'true'
+LOAN_PARTITION_YEARS_AHEAD = int(os.environ.get('LOAN_PARTITION_YEARS_AHEAD', 2))
+
+CELERY_BEAT_SCHEDULE = {
+    'ensure-loan-partitions': {
+        'task': 'loans.tasks.ensure_loan_partitions',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Rows per checkpointed ingest chunk, and rows per INSERT within a chunk
+INGEST_CHUNK_SIZE = int(os.environ.get('INGEST_CHUNK_SIZE', 50000))
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 5000))
+
+# Bulk customer onboarding
+BULK_REGISTRATION_BATCH_SIZE = int(os.environ.get('BULK_REGISTRATION_BATCH_SIZE', 2000))
+BULK_REGISTRATION_MAX_ROWS = int(os.environ.get('BULK_REGISTRATION_MAX_ROWS', 100000))
+# JSON batches are read into memory; CSV uploads are streamed to a temporary file instead
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('DATA_UPLOAD_MAX_MEMORY_SIZE', 20 * 1024 * 1024))
+
+# Rows fetched per server-side cursor round trip (and written per block) by the loan export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Decision audit log (write-behind buffer, see loans/audit.py)
+DECISION_LOG_WRITE_BEHIND = os.environ.get('DECISION_LOG_WRITE_BEHIND', 'true').lower() == 'true'
+DECISION_LOG_BATCH_SIZE = int(os.environ.get('DECISION_LOG_BATCH_SIZE', 500))
+DECISION_LOG_FLUSH_INTERVAL = float(os.environ.get('DECISION_LOG_FLUSH_INTERVAL', 2.0))
+DECISION_LOG_MAX_BUFFER = int(os.environ.get('DECISION_LOG_MAX_BUFFER', 10000))
+
+# Coalesce concurrent credit profile computations across processes through a Redis lock
+CREDIT_PROFILE_COALESCE_ACROSS_PROCESSES = os.environ.get('CREDIT_PROFILE_COALESCE_ACROSS_PROCESSES', 'false').lower() == 'true'
+
+# On-demand request profiling (see loans/profiling.py). Requests are profiled when they
+# carry a signed token in REQUEST_PROFILING_HEADER (manage.py profiling_token) or are
+# sampled; REQUEST_PROFILING_MODE is 'deterministic' (cProfile) or 'sampling'
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'false').lower() == 'true'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0.0))
+REQUEST_PROFILING_MODE = os.environ.get('REQUEST_PROFILING_MODE', 'deterministic')
+REQUEST_PROFILING_SAMPLE_INTERVAL = float(os.environ.get('REQUEST_PROFILING_SAMPLE_INTERVAL', 0.001))
+REQUEST_PROFILING_HEADER = os.environ.get('REQUEST_PROFILING_HEADER', 'X-Profile-Request')
+REQUEST_PROFILING_TOKEN_MAX_AGE = int(os.environ.get('REQUEST_PROFILING_TOKEN_MAX_AGE', 3600))
+REQUEST_PROFILING_DIR = os.environ.get('REQUEST_PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+REQUEST_PROFILING_MAX_PROFILES = int(os.environ.get('REQUEST_PROFILING_MAX_PROFILES', 200))
+REQUEST_PROFILING_TOP_FUNCTIONS = int(os.environ.get('REQUEST_PROFILING_TOP_FUNCTIONS', 40))
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -145,4 +214,5 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "x-profile-request",
 ]
\ No newline at end of file
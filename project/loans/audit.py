@@ -0,0 +1,171 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import close_old_connections
+from .models import DecisionLog
+
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionLogBuffer:
+    """
+    In-process write-behind buffer for DecisionLog entries.
+
+    Views append entries without touching the database; a daemon thread
+    flushes them with bulk_create once DECISION_LOG_BATCH_SIZE entries are
+    queued or every DECISION_LOG_FLUSH_INTERVAL seconds. The buffer never
+    holds more than DECISION_LOG_MAX_BUFFER entries: when it is full the
+    caller flushes synchronously, and if that write fails too (the database
+    is down) the oldest entries beyond the cap are dropped, logged and
+    counted in the 'dropped' metric rather than growing memory without bound.
+    """
+
+    def __init__(self):
+        self._entries = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'backpressure_flushes': 0,
+            'dropped': 0,
+            'high_water_mark': 0,
+        }
+
+    def record(self, **fields):
+        """
+        Queue a decision for writing. Falls back to a synchronous insert when
+        write-behind is disabled.
+        """
+        entry = DecisionLog(**fields)
+        if not settings.DECISION_LOG_WRITE_BEHIND:
+            entry.save()
+            with self._lock:
+                self._metrics['enqueued'] += 1
+                self._metrics['written'] += 1
+            return
+
+        self._ensure_started()
+        with self._lock:
+            self._entries.append(entry)
+            depth = len(self._entries)
+            self._metrics['enqueued'] += 1
+            self._metrics['high_water_mark'] = max(self._metrics['high_water_mark'], depth)
+
+        if depth >= settings.DECISION_LOG_MAX_BUFFER:
+            with self._lock:
+                self._metrics['backpressure_flushes'] += 1
+            logger.warning("Decision log buffer full (%d entries), flushing inline", depth)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Inline flush of the full decision log buffer failed")
+        elif depth >= settings.DECISION_LOG_BATCH_SIZE:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write every queued entry. Entries from a failed write are put back at
+        the front of the buffer so they are retried on the next flush, as far
+        as DECISION_LOG_MAX_BUFFER allows.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._entries)
+                self._entries.clear()
+            if not batch:
+                return 0
+            try:
+                DecisionLog.objects.bulk_create(batch, batch_size=settings.DECISION_LOG_BATCH_SIZE)
+            except Exception:
+                with self._lock:
+                    self._entries.extendleft(reversed(batch))
+                    self._metrics['failed_flushes'] += 1
+                    self._drop_overflow()
+                raise
+            with self._lock:
+                self._metrics['written'] += len(batch)
+                self._metrics['flushes'] += 1
+            return len(batch)
+
+    def _drop_overflow(self):
+        """
+        Drop the oldest entries beyond DECISION_LOG_MAX_BUFFER. Called with _lock held.
+        """
+        overflow = len(self._entries) - settings.DECISION_LOG_MAX_BUFFER
+        if overflow > 0:
+            for _ in range(overflow):
+                self._entries.popleft()
+            self._metrics['dropped'] += overflow
+            logger.error("Decision log buffer over capacity, dropped %d oldest entries", overflow)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, buffered=len(self._entries), running=self._thread is not None)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='decision-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(settings.DECISION_LOG_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush decision log buffer")
+
+    def shutdown(self, timeout=10):
+        """
+        Stop the flusher thread and write whatever is still buffered.
+        """
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+
+decision_log = DecisionLogBuffer()
+atexit.register(decision_log.shutdown)
+
+
+def record_decision(decision_type, customer_id, loan_amount, interest_rate, corrected_interest_rate,
+                    tenure, monthly_installment, approved, loan_id=None):
+    """
+    Queue an audit entry for an eligibility or loan creation decision. The
+    decision has already been made (and a loan possibly created), so a
+    failure to record it is logged rather than failing the request.
+    """
+    try:
+        decision_log.record(
+            decision_type=decision_type,
+            customer_id=customer_id,
+            loan_id=loan_id,
+            loan_amount=loan_amount,
+            interest_rate=interest_rate,
+            corrected_interest_rate=corrected_interest_rate,
+            tenure=tenure,
+            monthly_installment=monthly_installment,
+            approved=approved,
+        )
+    except Exception:
+        logger.exception("Failed to record %s decision for customer %s", decision_type, customer_id)
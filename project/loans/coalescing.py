@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import threading
+from datetime import date
+from decimal import Decimal
+from django.conf import settings
+from .utils import get_credit_profile
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _LockRenewal:
+    """
+    Keep a Redis lock from expiring while the computation it guards runs,
+    resetting its timeout every interval seconds from a background thread.
+    """
+
+    def __init__(self, lock, interval, errors):
+        self.lock = lock
+        self.interval = interval
+        self.errors = errors
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='singleflight-lock-renewal', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.lock.reacquire()
+            except self.errors as e:
+                logger.warning("Could not extend single-flight lock %s: %s", self.lock.name, e)
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent computations of the same key into a single call.
+
+    Threads (do) and asyncio tasks (do_async) asking for a key that is already
+    being computed wait for the in-flight result instead of recomputing it.
+    Results are not cached once the computation finishes. When redis_url is
+    set, the process that wins a Redis lock computes the value and publishes
+    it for the other processes waiting on the same key. The lock expires after
+    lock_timeout seconds unless its holder is alive to extend it.
+    """
+
+    def __init__(self, name, redis_url=None, lock_timeout=10, result_ttl=2, dumps=json.dumps, loads=json.loads):
+        self.name = name
+        self.redis_url = redis_url
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self.dumps = dumps
+        self.loads = loads
+        self._redis = None
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._metrics = {'computations': 0, 'coalesced': 0, 'remote_hits': 0, 'remote_errors': 0}
+
+    def _count(self, metric):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def stats(self):
+        """
+        Return the counters; 'saved' is the number of computations avoided.
+        """
+        with self._lock:
+            stats = dict(self._metrics)
+        stats['saved'] = stats['coalesced'] + stats['remote_hits']
+        return stats
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._count('coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._compute(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, fn):
+        """
+        Asyncio counterpart of do(); fn is a coroutine function. Calls are
+        coalesced per event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._async_calls.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._async_calls[(loop, key)] = loop.create_future()
+
+        if not leader:
+            self._count('coalesced')
+            return await asyncio.shield(future)
+
+        try:
+            self._count('computations')
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_calls[(loop, key)]
+
+    def _compute(self, key, fn):
+        if not self.redis_url:
+            self._count('computations')
+            return fn()
+        try:
+            return self._compute_remote(key, fn)
+        except self._redis_errors() as e:
+            logger.warning("Redis single-flight for %s unavailable, computing locally: %s", self.name, e)
+            self._count('remote_errors')
+            self._count('computations')
+            return fn()
+
+    def _redis_errors(self):
+        import redis
+        return (redis.RedisError,)
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url)
+        return self._redis
+
+    def _compute_remote(self, key, fn):
+        from redis.exceptions import LockError
+
+        client = self._client()
+        redis_key = f"singleflight:{self.name}:{':'.join(str(part) for part in key)}"
+        # Whoever holds the lock is computing; everyone else blocks on it and then
+        # picks up the published result, recomputing only if the holder failed.
+        # The lock is renewed from another thread, so its token is not thread-local.
+        lock = client.lock(
+            f"{redis_key}:lock", timeout=self.lock_timeout, blocking_timeout=self.lock_timeout, thread_local=False
+        )
+        if not lock.acquire():
+            raise LockError(f"Timed out waiting for single-flight lock {lock.name}")
+        try:
+            cached = client.get(f"{redis_key}:result")
+            if cached is not None:
+                self._count('remote_hits')
+                return self.loads(cached)
+            self._count('computations')
+            with _LockRenewal(lock, self.lock_timeout / 3, self._redis_errors()):
+                result = fn()
+            # The result exists from here on: failing to share it costs the other
+            # processes a computation, but must not make this one compute again
+            try:
+                client.set(f"{redis_key}:result", self.dumps(result), px=int(self.result_ttl * 1000))
+            except self._redis_errors() as e:
+                logger.warning("Could not publish single-flight result for %s: %s", self.name, e)
+                self._count('remote_errors')
+            return result
+        finally:
+            self._release(lock)
+
+    def _release(self, lock):
+        try:
+            lock.release()
+        except self._redis_errors() as e:
+            # e.g. LockNotOwnedError once the lock has expired; nothing is left to undo
+            logger.warning("Could not release single-flight lock %s: %s", lock.name, e)
+            self._count('remote_errors')
+
+
+def _dump_credit_profile(profile):
+    credit_score, timeline = profile
+    return json.dumps([credit_score, [str(total_emi) for total_emi in timeline]])
+
+
+def _load_credit_profile(value):
+    credit_score, timeline = json.loads(value)
+    return credit_score, [Decimal(total_emi) for total_emi in timeline]
+
+
+credit_profiles = SingleFlight(
+    'credit_profile',
+    redis_url=settings.REDIS_URL if settings.CREDIT_PROFILE_COALESCE_ACROSS_PROCESSES else None,
+    dumps=_dump_credit_profile,
+    loads=_load_credit_profile,
+)
+
+
+def credit_profile_key(customer):
+    """
+    Identify a customer's loan state without an extra query: current_debt
+    changes whenever a loan is created, and the active-loan window moves daily.
+    """
+    return (customer.customer_id, str(customer.current_debt), date.today().isoformat())
+
+
+def get_coalesced_credit_profile(customer):
+    """
+    get_credit_profile, shared between concurrent requests for the same customer and loan state.
+    """
+    return credit_profiles.do(credit_profile_key(customer), lambda: get_credit_profile(customer))
@@ -0,0 +1,120 @@
+import csv
+import heapq
+import json
+from django.conf import settings
+from .models import Loan
+from .sharding import shard_aliases
+
+
+EXPORT_FIELDS = (
+    'loan_id',
+    'customer_id',
+    'loan_amount',
+    'tenure',
+    'interest_rate',
+    'monthly_repayment',
+    'emis_paid_on_time',
+    'start_date',
+    'end_date',
+    'date_approved',
+    'repayments_left',
+)
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the value, so csv.writer can format single lines.
+    """
+    def write(self, value):
+        return value
+
+
+def export_rows(date_approved_from=None, date_approved_to=None, start_date_from=None, start_date_to=None,
+                chunk_size=None):
+    """
+    Stream loan rows as tuples in EXPORT_FIELDS order.
+
+    Rows are fetched with QuerySet.iterator(), which uses a server-side cursor
+    on PostgreSQL, so only chunk_size rows are held in memory at a time. The
+    *_from bounds are inclusive and the *_to bounds exclusive, so consecutive
+    incremental pulls neither overlap nor skip rows. With sharding, the
+    shards are read side by side and merged in loan_id order.
+    """
+    loans = Loan.objects.order_by('loan_id')
+    if date_approved_from is not None:
+        loans = loans.filter(date_approved__gte=date_approved_from)
+    if date_approved_to is not None:
+        loans = loans.filter(date_approved__lt=date_approved_to)
+    if start_date_from is not None:
+        loans = loans.filter(start_date__gte=start_date_from)
+    if start_date_to is not None:
+        loans = loans.filter(start_date__lt=start_date_to)
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return loans.using(aliases[0]).values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    return heapq.merge(
+        *(loans.using(alias).values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size) for alias in aliases),
+        key=lambda row: row[0]
+    )
+
+
+def _format_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    # Decimals are exported as strings to keep their exact value
+    return str(value)
+
+
+def iter_csv(rows, lines_per_chunk=None):
+    """
+    Yield the CSV export in blocks of lines_per_chunk rows, header first.
+    """
+    lines_per_chunk = lines_per_chunk or settings.EXPORT_CHUNK_SIZE
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    block = []
+    for row in rows:
+        block.append(writer.writerow([_format_value(value) for value in row]))
+        if len(block) >= lines_per_chunk:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def iter_ndjson(rows, lines_per_chunk=None):
+    """
+    Yield the export as newline-delimited JSON objects in blocks of lines_per_chunk rows.
+    """
+    lines_per_chunk = lines_per_chunk or settings.EXPORT_CHUNK_SIZE
+    block = []
+    for row in rows:
+        block.append(json.dumps(dict(zip(EXPORT_FIELDS, map(_format_value, row)))) + '\n')
+        if len(block) >= lines_per_chunk:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+EXPORT_FORMATTERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+def stream_loans(export_format='csv', chunk_size=None, **filters):
+    """
+    Generate the loan export in the given format, one block of rows at a time.
+    """
+    return EXPORT_FORMATTERS[export_format](export_rows(chunk_size=chunk_size, **filters), chunk_size)
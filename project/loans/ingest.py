@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Min, Max
+from django.utils import timezone
+from .models import Customer, IngestChunk, Loan, normalize_phone_number
+from .sharding import group_by_shard, shard_aliases, sync_id_sequences
+
+
+INITIAL_DATA_JOB = 'initial'
+
+INGEST_FILES = {
+    IngestChunk.CUSTOMERS: 'customer_data.xlsx',
+    IngestChunk.LOANS: 'loan_data.xlsx',
+}
+
+# Spreadsheet headers such as "Customer ID" or "Monthly payment" are lower-cased and
+# underscored; these map the ones that differ from the model field names.
+COLUMN_ALIASES = {
+    'monthly_payment': 'monthly_repayment',
+    'date_of_approval': 'start_date',
+}
+
+
+def data_file(kind):
+    return os.path.join(settings.BASE_DIR, 'data', INGEST_FILES[kind])
+
+
+def normalise_column(name):
+    name = str(name).strip().lower().replace(' ', '_')
+    return COLUMN_ALIASES.get(name, name)
+
+
+def chunk_file(chunk):
+    return os.path.join(settings.BASE_DIR, 'data', 'chunks', chunk.job, f'{chunk.kind}-{chunk.start_row}.json')
+
+
+def iter_sheet_rows(path):
+    """
+    Stream the data rows of the first sheet as dicts keyed by the normalised
+    header. Blank cells are None; blank rows are skipped.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = [normalise_column(column) for column in next(rows, ())]
+        for row in rows:
+            if any(value is not None for value in row):
+                yield dict(zip(columns, row))
+    finally:
+        workbook.close()
+
+
+def write_chunk_rows(chunk, rows):
+    path = chunk_file(chunk)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(rows, f, cls=DjangoJSONEncoder)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_chunk_rows(chunk):
+    """
+    The rows plan_ingest split off for a chunk. Dates come back as ISO strings.
+    """
+    with open(chunk_file(chunk)) as f:
+        return json.load(f)
+
+
+def remove_chunk_files(job=INITIAL_DATA_JOB):
+    shutil.rmtree(os.path.join(settings.BASE_DIR, 'data', 'chunks', job), ignore_errors=True)
+
+
+def build_customers(rows):
+    return [
+        Customer(
+            customer_id=row['customer_id'],
+            first_name=row['first_name'],
+            last_name=row['last_name'],
+            age=row['age'],
+            phone_number=row['phone_number'],
+            phone_number_normalized=normalize_phone_number(row['phone_number']),
+            monthly_salary=row['monthly_salary'],
+            approved_limit=row['approved_limit'],
+            current_debt=row.get('current_debt', 0)
+        )
+        for row in rows
+    ]
+
+
+def build_loans(rows):
+    import pandas as pd
+
+    loans = []
+    for row in rows:
+        # Convert date strings to date objects
+        start_date = pd.to_datetime(row['start_date']).date() if pd.notna(row['start_date']) else datetime.now().date()
+        end_date = pd.to_datetime(row['end_date']).date() if pd.notna(row['end_date']) else (start_date + timedelta(days=30*row['tenure']))
+
+        # Calculate repayments left
+        tenure = row['tenure']
+        emis_paid = row.get('emis_paid_on_time', 0)
+        repayments_left = max(0, tenure - emis_paid)
+
+        loans.append(Loan(
+            loan_id=row['loan_id'],
+            customer_id=row['customer_id'],
+            loan_amount=row['loan_amount'],
+            tenure=tenure,
+            interest_rate=row['interest_rate'],
+            monthly_repayment=row['monthly_repayment'],
+            emis_paid_on_time=emis_paid,
+            start_date=start_date,
+            end_date=end_date,
+            repayments_left=repayments_left
+        ))
+    return loans
+
+
+CHUNK_LOADERS = {
+    IngestChunk.CUSTOMERS: (Customer, build_customers),
+    IngestChunk.LOANS: (Loan, build_loans),
+}
+
+
+def plan_ingest(job=INITIAL_DATA_JOB, chunk_size=None):
+    """
+    Split the data files into chunks on the first run of a job, reading each
+    sheet once and writing every chunk's rows to its own file for the chunk
+    tasks to load. Later runs reuse the existing plan so they resume where
+    the last one stopped.
+    """
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    if IngestChunk.objects.filter(job=job).exists():
+        return
+    chunks = []
+    for kind in (IngestChunk.CUSTOMERS, IngestChunk.LOANS):
+        rows = iter_sheet_rows(data_file(kind))
+        start = 0
+        while batch := list(islice(rows, chunk_size)):
+            chunk = IngestChunk(job=job, kind=kind, start_row=start, end_row=start + len(batch))
+            write_chunk_rows(chunk, batch)
+            chunks.append(chunk)
+            start = chunk.end_row
+    IngestChunk.objects.bulk_create(chunks, ignore_conflicts=True)
+
+
+def without_duplicate_ids(model, objects, using='default'):
+    """
+    Drop objects whose primary key repeats within the batch or already exists.
+    The source files contain duplicate IDs, and a partitioned loan table only
+    enforces uniqueness of (loan_id, start_date), so conflicts cannot be left
+    to the database alone.
+    """
+    unique = {}
+    for obj in objects:
+        unique.setdefault(obj.pk, obj)
+    existing = set(model.objects.using(using).filter(pk__in=list(unique)).values_list('pk', flat=True))
+    return [obj for pk, obj in unique.items() if pk not in existing]
+
+
+def load_chunk(chunk_id):
+    """
+    Load one chunk. The rows and the chunk's 'done' status commit together;
+    a failure marks the chunk failed and re-raises. With sharding, each
+    shard's rows commit just before the status, and a chunk that is loaded
+    again skips the rows that already made it.
+
+    Returns:
+        int: number of rows processed (0 if the chunk was already done)
+    """
+    chunk = IngestChunk.objects.get(pk=chunk_id)
+    if chunk.status == IngestChunk.DONE:
+        return 0
+
+    IngestChunk.objects.filter(pk=chunk.pk).update(
+        status=IngestChunk.RUNNING,
+        attempts=chunk.attempts + 1,
+        started_at=chunk.started_at or timezone.now(),
+        error=''
+    )
+    model, build = CHUNK_LOADERS[chunk.kind]
+    try:
+        objects = build(read_chunk_rows(chunk))
+        with transaction.atomic():
+            for alias, shard_objects in group_by_shard(objects).items():
+                with transaction.atomic(using=alias):
+                    model.objects.using(alias).bulk_create(
+                        without_duplicate_ids(model, shard_objects, using=alias),
+                        batch_size=settings.INGEST_BATCH_SIZE,
+                        ignore_conflicts=True
+                    )
+            IngestChunk.objects.filter(pk=chunk.pk).update(status=IngestChunk.DONE, completed_at=timezone.now())
+    except Exception as e:
+        IngestChunk.objects.filter(pk=chunk.pk).update(status=IngestChunk.FAILED, error=str(e))
+        raise
+    return len(objects)
+
+
+def reset_sequences():
+    """
+    Move the ID sequences past the explicitly loaded IDs so new customers and
+    loans do not collide with them (a no-op on SQLite), and the global ID
+    counters past them when sharded.
+    """
+    for alias in shard_aliases():
+        connection = connections[alias]
+        statements = connection.ops.sequence_reset_sql(no_style(), [Customer, Loan])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    sync_id_sequences([Customer, Loan])
+
+
+def ingest_progress(job=INITIAL_DATA_JOB):
+    """
+    Summarise the chunks of a job with throughput and an ETA.
+
+    Returns:
+        dict or None if the job has never been planned
+    """
+    chunks = list(IngestChunk.objects.filter(job=job))
+    if not chunks:
+        return None
+
+    kinds = {}
+    for kind, _ in IngestChunk.KINDS:
+        kind_chunks = [chunk for chunk in chunks if chunk.kind == kind]
+        kinds[kind] = {
+            'chunks': len(kind_chunks),
+            'chunks_done': sum(chunk.status == IngestChunk.DONE for chunk in kind_chunks),
+            'chunks_failed': sum(chunk.status == IngestChunk.FAILED for chunk in kind_chunks),
+            'rows': sum(chunk.row_count for chunk in kind_chunks),
+            'rows_done': sum(chunk.row_count for chunk in kind_chunks if chunk.status == IngestChunk.DONE),
+        }
+
+    rows = sum(kind['rows'] for kind in kinds.values())
+    rows_done = sum(kind['rows_done'] for kind in kinds.values())
+    timestamps = IngestChunk.objects.filter(job=job).aggregate(
+        started_at=Min('started_at'), last_completed_at=Max('completed_at')
+    )
+
+    if rows_done == rows:
+        status = IngestChunk.DONE
+    elif any(chunk.status == IngestChunk.FAILED for chunk in chunks):
+        status = IngestChunk.FAILED
+    elif timestamps['started_at'] is None:
+        status = IngestChunk.PENDING
+    else:
+        status = IngestChunk.RUNNING
+
+    rows_per_second = None
+    eta_seconds = None
+    if timestamps['started_at'] and rows_done:
+        end = timestamps['last_completed_at'] if status == IngestChunk.DONE else timezone.now()
+        elapsed = (end - timestamps['started_at']).total_seconds()
+        if elapsed > 0:
+            rows_per_second = rows_done / elapsed
+            eta_seconds = (rows - rows_done) / rows_per_second
+
+    return {
+        'job': job,
+        'status': status,
+        'rows': rows,
+        'rows_done': rows_done,
+        'percent_done': round(100 * rows_done / rows, 2) if rows else 100.0,
+        'rows_per_second': rows_per_second,
+        'eta_seconds': eta_seconds,
+        'started_at': timestamps['started_at'],
+        'kinds': kinds,
+    }
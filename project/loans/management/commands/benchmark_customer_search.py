@@ -0,0 +1,151 @@
+import random
+import string
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from loans.models import Customer, normalize_phone_number
+from loans.search import search_by_name, search_by_phone
+from loans.sharding import allocate_ids, group_by_shard, scatter, sharding_enabled
+from loans.views import CustomerSearchPagination
+
+
+def synthetic_name(rng):
+    return rng.choice(string.ascii_uppercase) + ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def reserve_customer_ids(count):
+    """
+    Reserve count consecutive customer IDs so registrations made while the
+    benchmark runs get IDs after them: from the global ID counter when
+    sharded, otherwise by moving the table's ID sequence past the range while
+    inserts into the table are blocked.
+
+    Returns:
+        range: the reserved IDs
+    """
+    if sharding_enabled():
+        return allocate_ids(Customer, count)
+    connection = connections[DEFAULT_DB_ALIAS]
+    table = Customer._meta.db_table
+    with transaction.atomic(using=DEFAULT_DB_ALIAS), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(
+                'SELECT setval(pg_get_serial_sequence(%s, %s), nextval(pg_get_serial_sequence(%s, %s)) + %s - 1)',
+                [table, 'customer_id', table, 'customer_id', count]
+            )
+        elif connection.vendor == 'sqlite':
+            # AUTOINCREMENT tables take the next ID from sqlite_sequence; the
+            # UPDATE holds SQLite's write lock until the transaction commits
+            cursor.execute(f'SELECT COALESCE(MAX(customer_id), 0) FROM {table}')
+            highest = cursor.fetchone()[0]
+            cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) + %s WHERE name = %s', [highest, count, table])
+            if not cursor.rowcount:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, highest + count])
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+        else:
+            raise CommandError(f'Reserving customer IDs is not supported on {connection.vendor}.')
+        last_id = cursor.fetchone()[0]
+    return range(last_id - count + 1, last_id + 1)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic customers and report customer search latency percentiles against a target.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=3_000_000, help='Synthetic customers to generate')
+        parser.add_argument('--queries', type=int, default=200, help='Queries timed per search type')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per bulk insert')
+        parser.add_argument('--target-ms', type=float, default=50.0, help='p95 latency target per query')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated customers instead of deleting them')
+        parser.add_argument(
+            '--allow-writes', action='store_true',
+            help='Required: the synthetic customers are written to the configured databases, which should be a '
+                 'dedicated benchmark database'
+        )
+
+    def generate(self, rng, customer_ids, batch_size):
+        names = [synthetic_name(rng) for _ in range(max(1, len(customer_ids) // 50))]
+        samples = []
+        for start in range(0, len(customer_ids), batch_size):
+            batch = []
+            for customer_id in customer_ids[start:start + batch_size]:
+                phone_number = f'9{customer_id:09d}'[-10:]
+                batch.append(Customer(
+                    customer_id=customer_id,
+                    first_name=rng.choice(names),
+                    last_name=rng.choice(names),
+                    age=rng.randint(21, 65),
+                    phone_number=phone_number,
+                    phone_number_normalized=normalize_phone_number(phone_number),
+                    monthly_salary=50000,
+                    approved_limit=1800000,
+                    current_debt=0
+                ))
+            for alias, shard_batch in group_by_shard(batch).items():
+                Customer.objects.using(alias).bulk_create(shard_batch)
+            samples.append(rng.choice(batch))
+            self.stdout.write(f'\rGenerated {start + len(batch)} customers', ending='')
+        self.stdout.write('')
+        return samples
+
+    def time_queries(self, queries, search):
+        paginator = CustomerSearchPagination()
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            # The same work the endpoint does for the first page: count plus one page of rows
+            customers = search(query)
+            customers.count()
+            list(customers[:paginator.page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        if not options['allow_writes']:
+            raise CommandError(
+                'This inserts synthetic customers into the configured databases; '
+                'run it against a dedicated benchmark database with --allow-writes.'
+            )
+        if options['customers'] < 1:
+            raise CommandError('--customers must be at least 1.')
+        rng = random.Random(options['seed'])
+        customer_ids = reserve_customer_ids(options['customers'])
+        failed = False
+        try:
+            samples = self.generate(rng, customer_ids, options['batch_size'])
+            searches = {
+                'phone': ([rng.choice(samples).phone_number for _ in range(options['queries'])], search_by_phone),
+                'name prefix': (
+                    [rng.choice(samples).last_name[:rng.randint(2, 4)] for _ in range(options['queries'])],
+                    search_by_name
+                ),
+                'full name': (
+                    [f'{c.first_name} {c.last_name}' for c in (rng.choice(samples) for _ in range(options['queries']))],
+                    search_by_name
+                ),
+            }
+            for label, (queries, search) in searches.items():
+                timings = self.time_queries(queries, search)
+                p50, p95, p99 = (percentile(timings, fraction) for fraction in (0.5, 0.95, 0.99))
+                ok = p95 <= options['target_ms']
+                failed = failed or not ok
+                style = self.style.SUCCESS if ok else self.style.ERROR
+                self.stdout.write(style(
+                    f'{label:12s} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  p99 {p99:8.2f} ms  '
+                    f'({"meets" if ok else "misses"} {options["target_ms"]:.0f} ms p95 target)'
+                ))
+        finally:
+            if not options['keep']:
+                # Only the reserved range, so customers registered meanwhile are left alone
+                scatter(lambda alias: Customer.objects.using(alias).filter(
+                    customer_id__range=(customer_ids[0], customer_ids[-1])
+                ).delete())
+        if failed:
+            self.stdout.write(self.style.WARNING('At least one search type missed the latency target.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from loans.partitioning import ensure_loan_partitions, is_partitioned, partition_loan_table, supports_partitioning
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming yearly partitions of the loan table, optionally converting it to a partitioned table first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years-ahead', type=int, help='Create partitions up to this many years ahead')
+        parser.add_argument('--convert', action='store_true', help='Convert an unpartitioned loan table first')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not supports_partitioning(connection):
+            raise CommandError('Loan table partitioning requires PostgreSQL.')
+        if options['convert'] and not is_partitioned(connection):
+            partition_loan_table(connection, options['years_ahead'])
+            self.stdout.write('Converted loans_loan to a partitioned table')
+        if not is_partitioned(connection):
+            raise CommandError('loans_loan is not partitioned; run with --convert to convert it.')
+        created = ensure_loan_partitions(options['years_ahead'], using=options['database'])
+        self.stdout.write(f"Created partitions: {', '.join(created) or 'none'}")
@@ -0,0 +1,39 @@
+from datetime import date, datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from loans.export import EXPORT_FORMATTERS, stream_loans
+
+
+def aware_datetime(value):
+    moment = datetime.fromisoformat(value)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = 'Stream the loan book as CSV or newline-delimited JSON with constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATTERS), default='csv')
+        parser.add_argument('--output', help='File to write to (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per cursor round trip')
+        parser.add_argument('--date-approved-from', type=aware_datetime, help='Inclusive lower bound on date_approved')
+        parser.add_argument('--date-approved-to', type=aware_datetime, help='Exclusive upper bound on date_approved')
+        parser.add_argument('--start-date-from', type=date.fromisoformat, help='Inclusive lower bound on start_date')
+        parser.add_argument('--start-date-to', type=date.fromisoformat, help='Exclusive upper bound on start_date')
+
+    def handle(self, *args, **options):
+        blocks = stream_loans(
+            options['format'],
+            chunk_size=options['chunk_size'],
+            date_approved_from=options['date_approved_from'],
+            date_approved_to=options['date_approved_to'],
+            start_date_from=options['start_date_from'],
+            start_date_to=options['start_date_to'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                for block in blocks:
+                    output.write(block)
+        else:
+            for block in blocks:
+                self.stdout.write(block, ending='')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Load (or resume loading) the initial customer and loan data from the Excel files in the data directory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--async', action='store_true', dest='run_async', help='Enqueue the Celery task instead of running it inline')
+
+    def handle(self, *args, **options):
+        from loans.tasks import load_initial_data
+
+        if options['run_async']:
+            result = load_initial_data.delay()
+            self.stdout.write(f'Enqueued load_initial_data task {result.id}')
+        else:
+            self.stdout.write(load_initial_data(inline=True))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from loans.profiling import make_profiling_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed token that makes a request profiled when sent in the profiling header.'
+
+    def handle(self, *args, **options):
+        token = make_profiling_token()
+        if options['verbosity'] > 1:
+            self.stderr.write(
+                f'Send as "{settings.REQUEST_PROFILING_HEADER}: <token>"; '
+                f'valid for {settings.REQUEST_PROFILING_TOKEN_MAX_AGE} seconds.'
+            )
+        self.stdout.write(token)
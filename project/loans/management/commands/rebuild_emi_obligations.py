@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from loans.obligations import REBUILD_BATCH_SIZE, rebuild_emi_obligations
+
+
+class Command(BaseCommand):
+    help = "Recompute customers' EMI obligation timelines from their loans (all customers on every shard by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer-id', type=int, nargs='+', help='Only rebuild these customers')
+        parser.add_argument('--database', help='Only rebuild this database (default: every shard)')
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_emi_obligations(options['customer_id'], options['database'], options['batch_size'])
+        self.stdout.write(f'Wrote {written} obligation rows in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,67 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from loans.simulation import load_credit_profiles, policy_grid, simulate_policy_grid
+
+
+def parse_rate_floor_bands(value):
+    """
+    Parse a band specification such as "30:12,10:16" into ((30, 12.0), (10, 16.0)).
+    """
+    try:
+        bands = tuple(
+            (int(lower), float(rate))
+            for lower, rate in (band.split(':') for band in value.split(','))
+        )
+    except ValueError:
+        raise CommandError(f'Invalid rate floor bands "{value}", expected e.g. "30:12,10:16".')
+    return tuple(sorted(bands, reverse=True))
+
+
+class Command(BaseCommand):
+    help = 'Simulate alternative eligibility thresholds over every customer and report approval and exposure deltas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenure', type=int, required=True, help='Requested tenure in months')
+        parser.add_argument('--interest-rate', type=float, required=True, help='Requested annual interest rate in percentage')
+        amount = parser.add_mutually_exclusive_group(required=True)
+        amount.add_argument('--loan-amount', type=float, help='Requested loan amount for every customer')
+        amount.add_argument('--limit-fraction', type=float, help="Request this fraction of each customer's approved limit")
+        parser.add_argument('--approval-threshold', type=int, nargs='+', help='Credit scores above this are approved at the requested rate')
+        parser.add_argument('--rate-floor-bands', nargs='+', help='Rate floor bands as "lower:minimum_rate,..." e.g. "30:12,10:16"')
+        parser.add_argument('--emi-ratio', type=float, nargs='+', help='Maximum share of monthly salary spent on EMIs')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        profiles = load_credit_profiles(tenure=options['tenure'])
+        loaded = time.perf_counter()
+
+        if options['loan_amount'] is not None:
+            loan_amount = options['loan_amount']
+        else:
+            loan_amount = profiles.approved_limit * options['limit_fraction']
+
+        policies = policy_grid(
+            options['approval_threshold'],
+            [parse_rate_floor_bands(value) for value in options['rate_floor_bands'] or []],
+            options['emi_ratio'],
+        )
+        baseline, results = simulate_policy_grid(
+            profiles, policies, loan_amount, options['interest_rate'], options['tenure']
+        )
+        finished = time.perf_counter()
+
+        self.stdout.write(
+            f'Loaded {len(profiles)} customer profiles in {loaded - started:.2f}s, '
+            f'simulated {len(policies)} policies in {finished - loaded:.2f}s'
+        )
+        self.stdout.write(
+            f'Baseline ({baseline.policy.describe()}): approval rate {baseline.approval_rate:.2%}, '
+            f'exposure {baseline.exposure:,.2f}'
+        )
+        for result in results:
+            self.stdout.write(
+                f'{result.policy.describe()}: approval rate {result.approval_rate:.2%} '
+                f'({result.approval_rate_delta:+.2%}), approved {result.approved}, '
+                f'rate corrected {result.rate_corrected}, exposure {result.exposure:,.2f} '
+                f'({result.exposure_delta:+,.2f})'
+            )
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Imported in a fresh interpreter so nothing is already cached in sys.modules
+BOOT_SCRIPT = (
+    "import django, importlib; "
+    "django.setup(); "
+    "importlib.import_module({urlconf!r}); "
+    "[importlib.import_module(name) for name in {modules!r}]"
+)
+
+
+def parse_importtime(output):
+    """
+    Parse `python -X importtime` output into (module, self_us, cumulative_us, depth) tuples.
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+class Command(BaseCommand):
+    help = 'Report the import-time breakdown of a cold process start (django.setup() plus the URLconf).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Number of packages and modules to list')
+        parser.add_argument('--module', action='append', default=[], help='Additional module to import after setup')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        script = BOOT_SCRIPT.format(urlconf=settings.ROOT_URLCONF, modules=options['module'])
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'credit_system.settings'))
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            raise CommandError(f'Startup failed:\n{process.stderr[-2000:]}')
+
+        entries = parse_importtime(process.stderr)
+        total_us = sum(self_us for _, self_us, _, _ in entries)
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in entries:
+            by_package[name.split('.')[0]] += self_us
+        packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+        top_level = sorted(
+            (entry for entry in entries if entry[3] == 0),
+            key=lambda entry: entry[2], reverse=True
+        )[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'total_ms': total_us / 1000,
+                'modules': len(entries),
+                'packages': [{'package': name, 'self_ms': us / 1000} for name, us in packages],
+                'imports': [{'module': name, 'cumulative_ms': cumulative / 1000} for name, _, cumulative, _ in top_level],
+            }, indent=2))
+            return
+
+        self.stdout.write(f'Total import time: {total_us / 1000:.1f} ms across {len(entries)} modules')
+        self.stdout.write('\nSelf time by top-level package:')
+        for name, us in packages:
+            self.stdout.write(f'  {us / 1000:9.1f} ms  {name}')
+        self.stdout.write('\nSlowest top-level imports (cumulative):')
+        for name, _, cumulative, _ in top_level:
+            self.stdout.write(f'  {cumulative / 1000:9.1f} ms  {name}')
@@ -0,0 +1,74 @@
+import logging
+import random
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .querycount import QueryRecorder
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCountMiddleware:
+    """
+    In DEBUG mode, record the SQL each request runs and report it in the
+    X-DB-Query-Count and X-DB-Time-Ms response headers. Repeated query
+    shapes (likely N+1 patterns) are logged as warnings. Queries issued while
+    a streaming response is consumed happen after the headers are sent and
+    are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DEBUG:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        response['X-DB-Query-Count'] = str(recorder.count)
+        response['X-DB-Time-Ms'] = f'{recorder.total_time * 1000:.2f}'
+        for sql, count in recorder.repeated_queries():
+            logger.warning("%s %s ran the same query %d times: %s", request.method, request.path, count, sql)
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in request profiling (REQUEST_PROFILING). A request is profiled when
+    it carries a valid signed token in REQUEST_PROFILING_HEADER (see the
+    profiling_token command) or is picked by REQUEST_PROFILING_SAMPLE_RATE.
+    The profile is written to the on-disk ring buffer and its ID returned in
+    the X-Profile-Id header. Removed from the middleware chain when profiling
+    is disabled.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.REQUEST_PROFILING_HEADER.upper().replace('-', '_')
+
+    def _trigger(self, request):
+        from .profiling import is_valid_profiling_token
+
+        token = request.META.get(self.header)
+        if token and is_valid_profiling_token(token):
+            return 'header'
+        if random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        from .profiling import profile_request, profile_store
+
+        response, profile = profile_request(self.get_response, request, trigger)
+        try:
+            response['X-Profile-Id'] = profile_store().save(profile)
+        except OSError:
+            logger.exception("Failed to store the profile of %s %s", request.method, request.path)
+        return response
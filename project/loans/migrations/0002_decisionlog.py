@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DecisionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decision_type', models.CharField(choices=[('eligibility_check', 'Eligibility check'), ('loan_creation', 'Loan creation')], max_length=20)),
+                ('customer_id', models.IntegerField(db_index=True)),
+                ('loan_id', models.IntegerField(blank=True, null=True)),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('corrected_interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('tenure', models.PositiveIntegerField()),
+                ('monthly_installment', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('approved', models.BooleanField()),
+                ('decided_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
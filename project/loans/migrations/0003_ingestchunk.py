@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_decisionlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=50)),
+                ('kind', models.CharField(choices=[('customers', 'Customers'), ('loans', 'Loans')], max_length=20)),
+                ('start_row', models.PositiveIntegerField(help_text='First data row of the chunk (0-based, header excluded)')),
+                ('end_row', models.PositiveIntegerField(help_text='Row after the last data row of the chunk')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['job', 'kind', 'start_row'],
+                'unique_together': {('job', 'kind', 'start_row')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_ingestchunk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'end_date'], name='loan_customer_end_date_idx'),
+        ),
+    ]
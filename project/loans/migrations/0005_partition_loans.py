@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_loans(apps, schema_editor):
+    if not settings.LOAN_PARTITIONING:
+        return
+    from loans.partitioning import partition_loan_table
+
+    partition_loan_table(schema_editor.connection)
+
+
+def unpartition_loans(apps, schema_editor):
+    from loans.partitioning import unpartition_loan_table
+
+    unpartition_loan_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """
+    Optionally convert loans_loan into a PostgreSQL table partitioned by
+    start_date year (LOAN_PARTITIONING=true). SQLite and unpartitioned
+    PostgreSQL databases are left unchanged.
+    """
+
+    dependencies = [
+        ('loans', '0004_loan_customer_end_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_loans, unpartition_loans, hints={'model_name': 'loan'}),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:40
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+TRIGRAM_INDEXES = {
+    'customer_first_name_trgm_idx': 'first_name',
+    'customer_last_name_trgm_idx': 'last_name',
+}
+
+
+def backfill_phone_number_normalized(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE loans_customer SET phone_number_normalized = regexp_replace(phone_number, '\\D', '', 'g')"
+        )
+        return
+    from loans.models import normalize_phone_number
+
+    Customer = apps.get_model('loans', 'Customer')
+    manager = Customer.objects.db_manager(schema_editor.connection.alias)
+    customers = manager.only('customer_id', 'phone_number').order_by('customer_id')
+    batch = []
+    for customer in customers.iterator(chunk_size=5000):
+        customer.phone_number_normalized = normalize_phone_number(customer.phone_number)
+        batch.append(customer)
+        if len(batch) >= 5000:
+            manager.bulk_update(batch, ['phone_number_normalized'])
+            batch = []
+    manager.bulk_update(batch, ['phone_number_normalized'])
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON loans_customer USING gin (lower({column}) gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_partition_loans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_number_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.RunPython(backfill_phone_number_normalized, migrations.RunPython.noop, hints={'model_name': 'customer'}),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='customer_first_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='customer_last_name_lower_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes, hints={'model_name': 'customer'}),
+    ]
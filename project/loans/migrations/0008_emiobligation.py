@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_emi_obligations(apps, schema_editor):
+    from loans.obligations import rebuild_shard
+
+    rebuild_shard(
+        schema_editor.connection.alias,
+        loan_model=apps.get_model('loans', 'Loan'),
+        obligation_model=apps.get_model('loans', 'EmiObligation')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_idsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmiObligation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total_emi', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emi_obligations', to='loans.customer')),
+            ],
+            options={
+                'unique_together': {('customer', 'month')},
+            },
+        ),
+        migrations.RunPython(build_emi_obligations, migrations.RunPython.noop, hints={'model_name': 'emiobligation'}),
+    ]
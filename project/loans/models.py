@@ -1,9 +1,27 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 import math
+import re
+
+
+def normalize_phone_number(phone_number):
+    """
+    Reduce a phone number to its digits so "+91 98765-43210" and "919876543210" match.
+    """
+    return re.sub(r'\D', '', str(phone_number or ''))
+
+
+def calculate_approved_limit(monthly_salary):
+    """
+    Calculate the approved limit for a monthly salary.
+    Formula: approved_limit = 36 * monthly_salary (rounded up to the nearest lakh)
+    """
+    return math.ceil(36 * monthly_salary / 100000) * 100000
 
 
 class Customer(models.Model):
@@ -17,15 +35,23 @@ class Customer(models.Model):
     monthly_salary = models.PositiveIntegerField()
     approved_limit = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     phone_number = models.CharField(max_length=15)  # Consider using PhoneNumberField
+    # Digits-only copy of phone_number for indexed exact lookups; kept in sync by save()
+    # and set explicitly by the bulk_create paths (onboarding, ingest)
+    phone_number_normalized = models.CharField(max_length=15, db_index=True, editable=False, default='')
     current_debt = models.DecimalField(max_digits=15, decimal_places=2, default=0.0)
 
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix search; PostgreSQL additionally gets trigram indexes (migration 0006)
+            models.Index(Lower('first_name'), name='customer_first_name_lower_idx'),
+            models.Index(Lower('last_name'), name='customer_last_name_lower_idx'),
+        ]
+
     def calculate_approved_limit(self):
         """
         Calculate the approved limit based on monthly salary.
-        Formula: approved_limit = 36 * monthly_salary (rounded to nearest lakh)
         """
-        raw_limit = 36 * self.monthly_salary
-        return math.ceil(raw_limit / 100000) * 100000
+        return calculate_approved_limit(self.monthly_salary)
 
     def update_current_debt(self):
         """
@@ -40,8 +66,12 @@ class Customer(models.Model):
         self.save()
 
     def save(self, *args, **kwargs):
+        from .sharding import shard_for_save
+
         if not self.approved_limit:
             self.approved_limit = self.calculate_approved_limit()
+        self.phone_number_normalized = normalize_phone_number(self.phone_number)
+        kwargs['using'] = shard_for_save(self, kwargs.get('using'))
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -64,6 +94,12 @@ class Loan(models.Model):
     date_approved = models.DateTimeField(auto_now_add=True)
     repayments_left = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [
+            # Active-loan lookups: customer_id = X AND end_date >= today
+            models.Index(fields=['customer', 'end_date'], name='loan_customer_end_date_idx'),
+        ]
+
     def calculate_monthly_repayment(self):
         """
         Calculate EMI using the formula: EMI = P * r * (1 + r)^n / ((1 + r)^n - 1)
@@ -83,11 +119,140 @@ class Loan(models.Model):
             raise ValidationError("EMIs paid on time cannot exceed the tenure.")
 
     def save(self, *args, **kwargs):
-        if not self.pk:  # If this is a new loan
+        from .sharding import shard_for_save
+
+        if self._state.adding:  # If this is a new loan (its ID may be preassigned when sharded)
             self.repayments_left = self.tenure
             self.monthly_repayment = self.calculate_monthly_repayment()
             self.end_date = self.start_date + relativedelta(months=self.tenure)
+        kwargs['using'] = shard_for_save(self, kwargs.get('using'))
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"Loan {self.loan_id} for Customer {self.customer.customer_id}"
\ No newline at end of file
+        return f"Loan {self.loan_id} for Customer {self.customer.customer_id}"
+
+class DecisionLogQuerySet(models.QuerySet):
+    """
+    Blocks the bulk paths around DecisionLog.save()/delete(). Raw SQL and
+    cascades from other models are not covered.
+    """
+
+    def update(self, **kwargs):
+        raise ValidationError("Decision log entries are append-only.")
+
+    def delete(self):
+        raise ValidationError("Decision log entries are append-only.")
+
+
+class DecisionLog(models.Model):
+    """
+    Append-only audit record of an eligibility check or loan creation decision.
+    Entries are written in batches by loans.audit.DecisionLogBuffer.
+    """
+    ELIGIBILITY_CHECK = 'eligibility_check'
+    LOAN_CREATION = 'loan_creation'
+    DECISION_TYPES = [
+        (ELIGIBILITY_CHECK, 'Eligibility check'),
+        (LOAN_CREATION, 'Loan creation'),
+    ]
+
+    decision_type = models.CharField(max_length=20, choices=DECISION_TYPES)
+    # Plain IDs rather than foreign keys so the audit trail outlives the records it describes
+    customer_id = models.IntegerField(db_index=True)
+    loan_id = models.IntegerField(null=True, blank=True)
+    loan_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    corrected_interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    tenure = models.PositiveIntegerField()
+    monthly_installment = models.DecimalField(max_digits=15, decimal_places=2)
+    approved = models.BooleanField()
+    decided_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = DecisionLogQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValidationError("Decision log entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Decision log entries are append-only.")
+
+    def __str__(self):
+        return f"{self.get_decision_type_display()} for Customer {self.customer_id} at {self.decided_at}"
+
+
+class IngestChunk(models.Model):
+    """
+    Checkpoint for one chunk of rows of an ingest job. A chunk's rows and its
+    'done' status are committed in the same transaction, so a restarted job
+    only reloads chunks that never committed.
+    """
+    CUSTOMERS = 'customers'
+    LOANS = 'loans'
+    KINDS = [
+        (CUSTOMERS, 'Customers'),
+        (LOANS, 'Loans'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    job = models.CharField(max_length=50)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    start_row = models.PositiveIntegerField(help_text="First data row of the chunk (0-based, header excluded)")
+    end_row = models.PositiveIntegerField(help_text="Row after the last data row of the chunk")
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [('job', 'kind', 'start_row')]
+        ordering = ['job', 'kind', 'start_row']
+
+    @property
+    def row_count(self):
+        return self.end_row - self.start_row
+
+    def __str__(self):
+        return f"{self.job} {self.kind} rows {self.start_row}-{self.end_row} ({self.status})"
+
+
+class IdSequence(models.Model):
+    """
+    Next free primary key of a sharded model (see loans.sharding). Lives in
+    the default database so IDs are unique across every shard.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class EmiObligation(models.Model):
+    """
+    Total monthly repayment a customer owes in one calendar month, summed over
+    the loans running that month. Rows start at the month they were computed
+    in; see loans.obligations for how they are maintained.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='emi_obligations')
+    month = models.DateField(help_text="First day of the month")
+    total_emi = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('customer', 'month')]
+
+    def __str__(self):
+        return f"Customer {self.customer_id} owes {self.total_emi} in {self.month:%Y-%m}"
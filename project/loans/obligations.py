@@ -0,0 +1,161 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from itertools import groupby, islice
+from operator import itemgetter
+from dateutil.relativedelta import relativedelta
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from .models import EmiObligation, Loan
+from .sharding import scatter, shard_aliases
+
+
+# A loan owes its monthly_repayment in the calendar months its EMIs fall due
+# in: tenure EMIs, the first one month after start_date. Only the current and
+# future months are stored: eligibility and forecasting never look back.
+
+# Loan fields whose change moves a loan's obligations
+TIMELINE_FIELDS = {'customer', 'customer_id', 'start_date', 'tenure', 'monthly_repayment'}
+
+# SQLite adds decimals as floats, so a released loan can leave a fraction of a paisa behind
+EMPTY_TOTAL = Decimal('0.01')
+
+REBUILD_BATCH_SIZE = 5000
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def months_between(first, last):
+    return (last.year - first.year) * 12 + last.month - first.month
+
+
+def due_months(start_date, tenure, since):
+    """
+    First days of the months in which the tenure EMIs of a loan starting on
+    start_date fall due, skipping those before the month since.
+    """
+    months = (month_start(start_date + relativedelta(months=emi)) for emi in range(1, tenure + 1))
+    return [month for month in months if month >= since]
+
+
+def record_loan(loan, using=DEFAULT_DB_ALIAS):
+    """
+    Add a new loan's EMI to its customer's timeline. Missing months are
+    created at zero first so the increment is a single UPDATE, which
+    concurrent loans of the same customer serialise on. Runs in the caller's
+    transaction (post_save), so callers that need the loan and its timeline
+    to commit together wrap the save in transaction.atomic().
+    """
+    months = due_months(loan.start_date, loan.tenure, month_start(date.today()))
+    if not months or not loan.monthly_repayment:
+        return
+    obligations = EmiObligation.objects.using(using)
+    obligations.bulk_create(
+        [EmiObligation(customer_id=loan.customer_id, month=month) for month in months],
+        ignore_conflicts=True
+    )
+    obligations.filter(customer_id=loan.customer_id, month__gte=months[0], month__lte=months[-1]).update(
+        total_emi=F('total_emi') + loan.monthly_repayment
+    )
+
+
+def release_loan(loan, using=DEFAULT_DB_ALIAS):
+    """
+    Remove a deleted loan's EMI from its customer's timeline, dropping the
+    months that no longer owe anything.
+    """
+    months = due_months(loan.start_date, loan.tenure, month_start(date.today()))
+    if not months or not loan.monthly_repayment:
+        return
+    obligations = EmiObligation.objects.using(using).filter(
+        customer_id=loan.customer_id, month__gte=months[0], month__lte=months[-1]
+    )
+    obligations.update(total_emi=F('total_emi') - loan.monthly_repayment)
+    obligations.filter(total_emi__lt=EMPTY_TOTAL).delete()
+
+
+def timeline_rows(loans, since, model=EmiObligation):
+    """
+    Build obligation rows from (customer_id, start_date, tenure,
+    monthly_repayment) tuples ordered by customer_id.
+    """
+    for customer_id, customer_loans in groupby(loans, key=itemgetter(0)):
+        totals = defaultdict(Decimal)
+        for _, start_date, tenure, monthly_repayment in customer_loans:
+            for month in due_months(start_date, tenure, since):
+                totals[month] += monthly_repayment
+        for month in sorted(totals):
+            if totals[month] >= EMPTY_TOTAL:
+                yield model(customer_id=customer_id, month=month, total_emi=totals[month])
+
+
+def rebuild_shard(alias, customer_ids=None, batch_size=REBUILD_BATCH_SIZE, loan_model=Loan, obligation_model=EmiObligation):
+    """
+    Replace the timelines of the given customers (all by default) in one
+    database with ones computed from their loans. Migrations pass their
+    historical models.
+
+    Returns:
+        int: number of obligation rows written
+    """
+    since = month_start(date.today())
+    # Every loan is read: the last due date follows from the tenure, which
+    # the source data does not always keep consistent with end_date
+    loans = loan_model.objects.using(alias).all()
+    obligations = obligation_model.objects.using(alias)
+    if customer_ids is not None:
+        loans = loans.filter(customer_id__in=customer_ids)
+        obligations = obligations.filter(customer_id__in=customer_ids)
+    loans = loans.order_by('customer_id').values_list('customer_id', 'start_date', 'tenure', 'monthly_repayment')
+
+    written = 0
+    rows = timeline_rows(loans.iterator(chunk_size=batch_size), since, obligation_model)
+    with transaction.atomic(using=alias):
+        obligations.delete()
+        while batch := list(islice(rows, batch_size)):
+            obligation_model.objects.using(alias).bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def rebuild_emi_obligations(customer_ids=None, using=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    rebuild_shard on one database, or on every shard (the default database
+    when unsharded). Loans loaded with bulk_create, e.g. by the ingest, only
+    get their timelines this way.
+
+    Returns:
+        int: number of obligation rows written
+    """
+    aliases = [using] if using else shard_aliases()
+    return sum(scatter(lambda alias: rebuild_shard(alias, customer_ids, batch_size), aliases))
+
+
+def emi_timeline(customer, as_of=None):
+    """
+    The customer's total EMI per month from as_of's month on, in one query.
+
+    Returns:
+        list: Decimal totals, index 0 being as_of's month; months after the
+        last entry owe nothing
+    """
+    since = month_start(as_of or date.today())
+    rows = customer.emi_obligations.filter(month__gte=since).order_by('month').values_list('month', 'total_emi')
+    timeline = []
+    for month, total_emi in rows:
+        offset = months_between(since, month)
+        timeline.extend([Decimal('0')] * (offset - len(timeline)))
+        timeline.append(total_emi)
+    return timeline
+
+
+def peak_emi(timeline, tenure):
+    """
+    The highest monthly total over the months in which a loan taken now for
+    tenure months owes its EMIs: offsets 1 to tenure, as the first EMI is due
+    a month after disbursal. EMIs due this month are left out, including
+    those of loans whose last EMI has already been paid.
+    """
+    return max(timeline[1:tenure + 1], default=Decimal('0'))
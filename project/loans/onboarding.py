@@ -0,0 +1,160 @@
+import csv
+import io
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import transaction
+from .models import Customer, calculate_approved_limit, normalize_phone_number
+from .sharding import assign_global_ids, group_by_shard
+
+
+REGISTRATION_FIELDS = ('first_name', 'last_name', 'age', 'monthly_salary', 'phone_number')
+
+# Field bounds mirror CustomerRegistrationSerializer / the Customer model
+NAME_MAX_LENGTH = 100
+PHONE_MAX_LENGTH = 15
+MIN_AGE = 18
+MIN_SALARY = 1
+MAX_INTEGER = 2147483647
+
+
+def parse_csv_rows(uploaded_file):
+    """
+    Read an uploaded CSV file into a list of row dicts keyed by the header row.
+
+    Raises:
+        ValueError: if the file is not UTF-8 or not valid CSV
+    """
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    try:
+        return [dict(row) for row in csv.DictReader(text)]
+    except UnicodeDecodeError:
+        raise ValueError('The uploaded file is not UTF-8 encoded.')
+    except csv.Error as exc:
+        raise ValueError(f'The uploaded file is not a valid CSV file: {exc}')
+    finally:
+        text.detach()
+
+
+def _clean_text(value, max_length, errors, field):
+    if value is None:
+        errors[field] = ['This field is required.']
+        return None
+    value = str(value).strip()
+    if not value:
+        errors[field] = ['This field may not be blank.']
+    elif len(value) > max_length:
+        errors[field] = [f'Ensure this field has no more than {max_length} characters.']
+    return value
+
+
+def _clean_integer(value, min_value, errors, field):
+    if value is None or value == '':
+        errors[field] = ['This field is required.']
+        return None
+    if isinstance(value, bool):
+        errors[field] = ['A valid integer is required.']
+        return None
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        errors[field] = ['A valid integer is required.']
+        return None
+    if number < min_value:
+        errors[field] = [f'Ensure this value is greater than or equal to {min_value}.']
+    elif number > MAX_INTEGER:
+        errors[field] = [f'Ensure this value is less than or equal to {MAX_INTEGER}.']
+    return number
+
+
+def validate_registration_rows(rows):
+    """
+    Validate registration rows without building a serializer per row.
+
+    Returns:
+        tuple: (cleaned rows, {row index: field errors}) where cleaned rows
+        holds None for every row that failed validation.
+    """
+    cleaned = []
+    errors = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[index] = {'non_field_errors': ['Invalid data. Expected a dictionary.']}
+            cleaned.append(None)
+            continue
+
+        row_errors = {}
+        data = {
+            'first_name': _clean_text(row.get('first_name'), NAME_MAX_LENGTH, row_errors, 'first_name'),
+            'last_name': _clean_text(row.get('last_name'), NAME_MAX_LENGTH, row_errors, 'last_name'),
+            'age': _clean_integer(row.get('age'), MIN_AGE, row_errors, 'age'),
+            'monthly_salary': _clean_integer(row.get('monthly_salary'), MIN_SALARY, row_errors, 'monthly_salary'),
+            'phone_number': _clean_text(row.get('phone_number'), PHONE_MAX_LENGTH, row_errors, 'phone_number'),
+        }
+        # approved_limit is derived from the salary and has to fit its column too
+        if 'monthly_salary' not in row_errors and calculate_approved_limit(data['monthly_salary']) > MAX_INTEGER:
+            row_errors['monthly_salary'] = [f'The approved limit for this salary exceeds {MAX_INTEGER}.']
+        if row_errors:
+            errors[index] = row_errors
+            cleaned.append(None)
+        else:
+            cleaned.append(data)
+    return cleaned, errors
+
+
+def calculate_approved_limits(monthly_salaries):
+    """
+    Vectorized counterpart of models.calculate_approved_limit.
+
+    Uses integer ceiling division so the result matches the scalar formula
+    without going through floating point.
+    """
+    import numpy as np
+
+    salaries = np.asarray(monthly_salaries, dtype=np.int64)
+    return -(-36 * salaries // 100000) * 100000
+
+
+def bulk_register_customers(rows, batch_size=None):
+    """
+    Validate and insert a batch of customer registrations. The valid rows
+    are inserted all or nothing: when sharded, every shard's insert runs
+    inside a transaction on each shard involved, so a failing shard rolls
+    back the others and the error propagates with nothing committed (short
+    of a shard failing in the commit itself, which has no two-phase commit).
+
+    Returns:
+        tuple: (customer_ids, errors) where customer_ids follows the input
+        order with None for rejected rows, and errors is a list of
+        {'row': index, 'errors': {...}} entries.
+    """
+    batch_size = batch_size or settings.BULK_REGISTRATION_BATCH_SIZE
+    cleaned, row_errors = validate_registration_rows(rows)
+
+    valid_indexes = [index for index, data in enumerate(cleaned) if data is not None]
+    approved_limits = calculate_approved_limits(
+        [cleaned[index]['monthly_salary'] for index in valid_indexes]
+    )
+
+    customers = [
+        Customer(
+            **cleaned[index],
+            phone_number_normalized=normalize_phone_number(cleaned[index]['phone_number']),
+            approved_limit=int(limit),
+            current_debt=0
+        )
+        for index, limit in zip(valid_indexes, approved_limits)
+    ]
+    assign_global_ids(Customer, customers)
+    shards = group_by_shard(customers)
+    with ExitStack() as stack:
+        for alias in shards:
+            stack.enter_context(transaction.atomic(using=alias))
+        for alias, shard_customers in shards.items():
+            Customer.objects.using(alias).bulk_create(shard_customers, batch_size=batch_size)
+
+    customer_ids = [None] * len(cleaned)
+    for index, customer in zip(valid_indexes, customers):
+        customer_ids[index] = customer.customer_id
+
+    errors = [{'row': index, 'errors': row_errors[index]} for index in sorted(row_errors)]
+    return customer_ids, errors
@@ -0,0 +1,195 @@
+from datetime import date
+from django.conf import settings
+from django.db import connections, transaction
+
+
+LOAN_TABLE = 'loans_loan'
+DEFAULT_PARTITION = f'{LOAN_TABLE}_default'
+
+
+def partition_name(year):
+    return f'{LOAN_TABLE}_y{year}'
+
+
+def supports_partitioning(connection):
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(connection):
+    """
+    Whether the loan table has been converted to a range-partitioned table.
+    """
+    if not supports_partitioning(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)",
+            [LOAN_TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def existing_partitions(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [LOAN_TABLE]
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _create_year_partition(cursor, year):
+    cursor.execute(
+        f"CREATE TABLE {partition_name(year)} PARTITION OF {LOAN_TABLE} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    )
+
+
+def create_year_partition(connection, year):
+    """
+    Create the partition for one start_date year. Rows for that year that
+    landed in the default partition are moved into the new partition.
+    """
+    bounds = [date(year, 1, 1), date(year + 1, 1, 1)]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE start_date >= %s AND start_date < %s)",
+            bounds
+        )
+        if not cursor.fetchone()[0]:
+            _create_year_partition(cursor, year)
+            return
+        cursor.execute(f"ALTER TABLE {LOAN_TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+        _create_year_partition(cursor, year)
+        cursor.execute(
+            f"INSERT INTO {LOAN_TABLE} SELECT * FROM {DEFAULT_PARTITION} WHERE start_date >= %s AND start_date < %s",
+            bounds
+        )
+        cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE start_date >= %s AND start_date < %s", bounds)
+        cursor.execute(f"ALTER TABLE {LOAN_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+
+
+def ensure_loan_partitions(years_ahead=None, using='default'):
+    """
+    Create any missing yearly partitions from the current year up to
+    years_ahead years in the future. A no-op unless the table is partitioned.
+
+    Returns:
+        list: names of the partitions created
+    """
+    connection = connections[using]
+    if not is_partitioned(connection):
+        return []
+    if years_ahead is None:
+        years_ahead = settings.LOAN_PARTITION_YEARS_AHEAD
+
+    existing = existing_partitions(connection)
+    created = []
+    current_year = date.today().year
+    for year in range(current_year, current_year + years_ahead + 1):
+        if partition_name(year) not in existing:
+            create_year_partition(connection, year)
+            created.append(partition_name(year))
+    return created
+
+
+def _table_definition(cursor):
+    """
+    Capture the primary key name, secondary index definitions and foreign
+    keys of the loan table so they can be recreated on a rebuilt table.
+    """
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+        [LOAN_TABLE]
+    )
+    primary_key = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s",
+        [LOAN_TABLE, primary_key]
+    )
+    # Indexes of a partitioned table are reported as "ON ONLY"; recreate them recursively
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [LOAN_TABLE]
+    )
+    foreign_keys = cursor.fetchall()
+    return primary_key, indexes, foreign_keys
+
+
+def _rebuild_loan_table(connection, partitioned, years_ahead):
+    old_table = f'{LOAN_TABLE}_old'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        primary_key, indexes, foreign_keys = _table_definition(cursor)
+        cursor.execute(
+            "SELECT attidentity <> '' FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'loan_id'",
+            [LOAN_TABLE]
+        )
+        is_identity = cursor.fetchone()[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'loan_id')", [LOAN_TABLE])
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {LOAN_TABLE} RENAME TO {old_table}")
+        cursor.execute(f"ALTER TABLE {old_table} RENAME CONSTRAINT {primary_key} TO {old_table}_pkey")
+        like = f"LIKE {old_table} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS"
+        if partitioned:
+            cursor.execute(f"CREATE TABLE {LOAN_TABLE} ({like}) PARTITION BY RANGE (start_date)")
+            cursor.execute(f"ALTER TABLE {LOAN_TABLE} ADD CONSTRAINT {primary_key} PRIMARY KEY (loan_id, start_date)")
+
+            cursor.execute(
+                f"SELECT EXTRACT(YEAR FROM MIN(start_date))::int, EXTRACT(YEAR FROM MAX(start_date))::int FROM {old_table}"
+            )
+            first_year, last_year = cursor.fetchone()
+            current_year = date.today().year
+            for year in range(min(first_year or current_year, current_year),
+                              max(last_year or current_year, current_year + years_ahead) + 1):
+                _create_year_partition(cursor, year)
+            cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {LOAN_TABLE} DEFAULT")
+        else:
+            cursor.execute(f"CREATE TABLE {LOAN_TABLE} ({like})")
+            cursor.execute(f"ALTER TABLE {LOAN_TABLE} ADD CONSTRAINT {primary_key} PRIMARY KEY (loan_id)")
+
+        cursor.execute(f"INSERT INTO {LOAN_TABLE} SELECT * FROM {old_table}")
+        if not is_identity:
+            # A serial column's sequence belongs to the old table; keep it alive
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {LOAN_TABLE}.loan_id")
+        cursor.execute(f"DROP TABLE {old_table} CASCADE")
+
+        # The captured definitions still name loans_loan, now the rebuilt table
+        for index in indexes:
+            cursor.execute(index)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {LOAN_TABLE} ADD CONSTRAINT {name} {definition}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'loan_id'), COALESCE(MAX(loan_id), 0) + 1, false) FROM {LOAN_TABLE}",
+            [LOAN_TABLE]
+        )
+
+
+def partition_loan_table(connection, years_ahead=None):
+    """
+    Convert loans_loan into a table range-partitioned by start_date year,
+    with one partition per year from the oldest loan up to years_ahead years
+    ahead, plus a default partition. Existing rows, indexes and foreign keys
+    are carried over. The primary key becomes (loan_id, start_date) because
+    PostgreSQL requires the partition key in unique constraints; loan_id
+    stays unique through its sequence.
+    """
+    if not supports_partitioning(connection) or is_partitioned(connection):
+        return
+    if years_ahead is None:
+        years_ahead = settings.LOAN_PARTITION_YEARS_AHEAD
+    _rebuild_loan_table(connection, partitioned=True, years_ahead=years_ahead)
+
+
+def unpartition_loan_table(connection):
+    """
+    Reverse of partition_loan_table: copy the rows back into a plain table
+    with loan_id as the primary key.
+    """
+    if not is_partitioned(connection):
+        return
+    _rebuild_loan_table(connection, partitioned=False, years_ahead=0)
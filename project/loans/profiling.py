@@ -0,0 +1,272 @@
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from . import utils
+from .querycount import QueryRecorder
+
+
+PROFILING_SALT = 'loans.profiling'
+
+# Functions whose time is reported separately in every profile
+TRACKED_FUNCTIONS = {
+    'calculate_credit_score': utils.calculate_credit_score.__code__,
+    'calculate_monthly_installment': utils.calculate_monthly_installment.__code__,
+}
+
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+
+def make_profiling_token():
+    """
+    Signed value for the REQUEST_PROFILING_HEADER header, valid for
+    REQUEST_PROFILING_TOKEN_MAX_AGE seconds.
+    """
+    return signing.TimestampSigner(salt=PROFILING_SALT).sign('profile')
+
+
+def is_valid_profiling_token(token):
+    try:
+        signing.TimestampSigner(salt=PROFILING_SALT).unsign(token, max_age=settings.REQUEST_PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _function_label(code):
+    return f'{os.path.relpath(code.co_filename, settings.BASE_DIR)}:{code.co_firstlineno}({code.co_name})'
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread records the stack of the
+    profiled thread every interval seconds. A function's time is estimated
+    as the number of samples it appears in times the interval.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = 0
+        self.inclusive = Counter()
+        self.leaf = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.leaf[frame.f_code] += 1
+            stack = set()
+            while frame is not None:
+                stack.add(frame.f_code)
+                frame = frame.f_back
+            self.inclusive.update(stack)
+
+    def enable(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def function_times(self):
+        return {
+            name: {'samples': self.inclusive[code], 'total_ms': self.inclusive[code] * self.interval * 1000}
+            for name, code in TRACKED_FUNCTIONS.items()
+        }
+
+    def top(self, limit):
+        return [
+            {
+                'function': _function_label(code),
+                'samples': count,
+                'self_samples': self.leaf[code],
+                'cumulative_ms': count * self.interval * 1000,
+            }
+            for code, count in self.inclusive.most_common(limit)
+        ]
+
+
+class DeterministicProfiler:
+    """
+    cProfile wrapper reporting in the same shape as StackSampler.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def enable(self):
+        self.profile.enable()
+
+    def disable(self):
+        self.profile.disable()
+
+    def _stats(self):
+        self.profile.create_stats()
+        return self.profile.stats
+
+    def function_times(self):
+        stats = self._stats()
+        times = {}
+        for name, code in TRACKED_FUNCTIONS.items():
+            calls, _, _, cumulative, _ = stats.get((code.co_filename, code.co_firstlineno, code.co_name), (0, 0, 0, 0, None))
+            times[name] = {'calls': calls, 'total_ms': cumulative * 1000}
+        return times
+
+    def top(self, limit):
+        entries = sorted(self._stats().items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [
+            {
+                'function': f'{os.path.relpath(filename, settings.BASE_DIR)}:{line}({name})' if line else name,
+                'calls': calls,
+                'self_ms': total * 1000,
+                'cumulative_ms': cumulative * 1000,
+            }
+            for (filename, line, name), (_, calls, total, cumulative, _) in entries
+        ]
+
+
+PROFILERS = {
+    'deterministic': DeterministicProfiler,
+    'sampling': lambda: StackSampler(settings.REQUEST_PROFILING_SAMPLE_INTERVAL),
+}
+
+
+def profile_request(get_response, request, trigger):
+    """
+    Run get_response(request) under the configured profiler and SQL recorder.
+
+    Returns:
+        tuple: (response, profile dict)
+    """
+    mode = settings.REQUEST_PROFILING_MODE
+    profiler = PROFILERS[mode]()
+    started_at = timezone.now()
+    started = time.perf_counter()
+    with QueryRecorder() as recorder:
+        try:
+            profiler.enable()
+        except ValueError:
+            # From Python 3.12 cProfile runs on sys.monitoring, which allows one
+            # profiler per process, so a request profiled while another one is
+            # gets the stack sampler instead
+            mode = 'sampling'
+            profiler = PROFILERS[mode]()
+            profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration = time.perf_counter() - started
+
+    return response, {
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'trigger': trigger,
+        'mode': mode,
+        'started_at': started_at.isoformat(),
+        'duration_ms': duration * 1000,
+        'functions': profiler.function_times(),
+        'sql': {
+            'count': recorder.count,
+            'total_ms': recorder.total_time * 1000,
+            'timeline': [
+                {
+                    'offset_ms': (query['started'] - started) * 1000,
+                    'duration_ms': query['duration'] * 1000,
+                    'alias': query['alias'],
+                    'sql': query['sql'],
+                }
+                for query in recorder.queries
+            ],
+        },
+        'profile': profiler.top(settings.REQUEST_PROFILING_TOP_FUNCTIONS),
+    }
+
+
+class ProfileStore:
+    """
+    Bounded on-disk ring buffer of request profiles, one JSON file each.
+    Writing a profile deletes the oldest ones beyond max_profiles.
+    """
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f'{profile_id}.json')
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # IDs start with a nanosecond timestamp, so they sort oldest first
+        return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        profile = dict(profile, id=profile_id)
+        temporary = os.path.join(self.directory, f'.{profile_id}.tmp')
+        with open(temporary, 'w') as output:
+            json.dump(profile, output)
+        os.replace(temporary, self._path(profile_id))
+
+        for old_id in self._ids()[:-self.max_profiles]:
+            try:
+                os.remove(self._path(old_id))
+            except FileNotFoundError:
+                # Removed concurrently by another process
+                pass
+        return profile_id
+
+    def get(self, profile_id):
+        """
+        Returns:
+            dict or None if there is no such profile
+        """
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as profile:
+                return json.load(profile)
+        except FileNotFoundError:
+            return None
+
+    def list(self):
+        """
+        Summaries of the stored profiles, newest first.
+        """
+        summaries = []
+        for profile_id in reversed(self._ids()):
+            profile = self.get(profile_id)
+            if profile is not None:
+                summary = {
+                    key: profile[key]
+                    for key in ('id', 'method', 'path', 'status', 'trigger', 'mode', 'started_at', 'duration_ms')
+                }
+                summary['sql_count'] = profile['sql']['count']
+                summary['functions'] = profile['functions']
+                summaries.append(summary)
+        return summaries
+
+
+def profile_store():
+    return ProfileStore(settings.REQUEST_PROFILING_DIR, settings.REQUEST_PROFILING_MAX_PROFILES)
@@ -0,0 +1,91 @@
+import json
+import os
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.db import connections
+
+
+QUERY_BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+
+# A query shape executed this many times in one request is reported as a likely N+1
+REPEATED_QUERY_THRESHOLD = 3
+
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_VALUES_LIST = re.compile(r'\((?:\.\.\.)\)(?:\s*,\s*\(\.\.\.\))+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape: literals and placeholder lists of any
+    length collapse, so queries that differ only by parameters compare equal.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    sql = _VALUES_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """
+    Context manager recording every SQL statement the current thread runs on
+    any database connection, with its parameters, perf_counter() start time
+    and duration in seconds.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': params,
+                'started': started,
+                'duration': time.perf_counter() - started,
+            })
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(query['duration'] for query in self.queries)
+
+    def repeated_queries(self, threshold=REPEATED_QUERY_THRESHOLD):
+        """
+        Query shapes run at least threshold times on the same database, most
+        frequent first. The same query on every shard is a scatter, not an N+1.
+
+        Returns:
+            list: (normalized sql, count) tuples
+        """
+        shapes = Counter((query['alias'], normalize_sql(query['sql'])) for query in self.queries)
+        return [(sql, count) for (_, sql), count in shapes.most_common() if count >= threshold]
+
+
+def load_query_budgets(path=QUERY_BUDGETS_FILE):
+    """
+    Maximum number of queries allowed per URL name.
+    """
+    with open(path) as budgets:
+        return json.load(budgets)
@@ -0,0 +1,86 @@
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Greatest, Lower
+from .models import Customer, normalize_phone_number
+from .sharding import on_every_shard
+
+
+def _next_prefix(prefix):
+    """
+    Smallest string greater than every string starting with prefix, so a prefix
+    match can be written as a range the lower(name) B-tree indexes can serve.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_by_phone(phone_number):
+    """
+    Exact match on the digits of the phone number (indexed column).
+    """
+    digits = normalize_phone_number(phone_number)
+    if not digits:
+        return Customer.objects.none()
+    return on_every_shard(
+        lambda alias: Customer.objects.using(alias).filter(phone_number_normalized=digits).order_by('customer_id'),
+        key=lambda customer: customer.customer_id
+    )
+
+
+def _prefix_match(token):
+    upper = _next_prefix(token)
+    return (
+        Q(first_name_lower__gte=token, first_name_lower__lt=upper)
+        | Q(last_name_lower__gte=token, last_name_lower__lt=upper)
+    )
+
+
+def _name_query(alias, tokens):
+    customers = Customer.objects.using(alias).alias(
+        first_name_lower=Lower('first_name'), last_name_lower=Lower('last_name')
+    )
+    if connections[alias].vendor != 'postgresql':
+        for token in tokens:
+            customers = customers.filter(_prefix_match(token))
+        return customers.order_by(Lower('last_name'), Lower('first_name'), 'customer_id')
+
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    for token in tokens:
+        # LIKE 'token%' and the similarity operator are both served by the trigram indexes
+        customers = customers.filter(
+            Q(first_name_lower__startswith=token)
+            | Q(last_name_lower__startswith=token)
+            | Q(TrigramSimilar(Lower('first_name'), token))
+            | Q(TrigramSimilar(Lower('last_name'), token))
+        )
+    query = ' '.join(tokens)
+    return customers.annotate(
+        similarity=Greatest(
+            TrigramSimilarity(Lower('first_name'), query),
+            TrigramSimilarity(Lower('last_name'), query),
+        )
+    ).order_by('-similarity', 'customer_id')
+
+
+def _name_order(customer):
+    if hasattr(customer, 'similarity'):
+        return (-customer.similarity, customer.customer_id)
+    return (customer.last_name.lower(), customer.first_name.lower(), customer.customer_id)
+
+
+def search_by_name(name):
+    """
+    Case-insensitive name search. Every word of the query has to match the
+    first or last name.
+
+    On PostgreSQL a word matches by prefix or by trigram similarity (pg_trgm,
+    served by the GIN indexes of migration 0006) and results are ordered by
+    similarity. Elsewhere a word matches by prefix only, using the lower(name)
+    expression indexes, and results are ordered by name. With sharding, the
+    shards' results are merged in the same order.
+    """
+    tokens = name.lower().split()
+    if not tokens:
+        return Customer.objects.none()
+    return on_every_shard(lambda alias: _name_query(alias, tokens), key=_name_order)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
-from .models import Customer, Loan
-import math
+from .models import Customer, Loan, calculate_approved_limit
+from .sharding import assign_global_ids, shard_for_customer
 
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,9 +17,8 @@ class CustomerRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         monthly_salary = validated_data.get('monthly_salary')
-        raw_limit = 36 * monthly_salary
-        approved_limit = math.ceil(raw_limit / 100000) * 100000
-        customer = Customer.objects.create(
+        approved_limit = calculate_approved_limit(monthly_salary)
+        customer = Customer(
             first_name=validated_data.get('first_name'),
             last_name=validated_data.get('last_name'),
             age=validated_data.get('age'),
@@ -28,6 +27,8 @@ class CustomerRegistrationSerializer(serializers.ModelSerializer):
             phone_number=validated_data.get('phone_number'),
             current_debt=0
         )
+        assign_global_ids(Customer, [customer])
+        customer.save(force_insert=True, using=shard_for_customer(customer.customer_id))
         return customer
 
 class CustomerResponseSerializer(serializers.ModelSerializer):
@@ -77,4 +78,22 @@ class LoanDetailSerializer(serializers.ModelSerializer):
 class LoanListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Loan
-        fields = ['loan_id', 'loan_amount', 'interest_rate', 'monthly_repayment', 'repayments_left']
\ No newline at end of file
+        fields = ['loan_id', 'loan_amount', 'interest_rate', 'monthly_repayment', 'repayments_left']
+
+class LoanExportQuerySerializer(serializers.Serializer):
+    # Not 'format', which DRF reserves for renderer selection
+    export_format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    date_approved_from = serializers.DateTimeField(required=False)
+    date_approved_to = serializers.DateTimeField(required=False)
+    start_date_from = serializers.DateField(required=False)
+    start_date_to = serializers.DateField(required=False)
+
+
+class CustomerSearchQuerySerializer(serializers.Serializer):
+    phone_number = serializers.CharField(required=False)
+    name = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if bool(data.get('phone_number')) == bool(data.get('name')):
+            raise serializers.ValidationError("Provide exactly one of 'phone_number' or 'name'.")
+        return data
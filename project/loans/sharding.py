@@ -0,0 +1,240 @@
+import heapq
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Max
+from .models import IdSequence
+
+
+# Customer-scoped models (by model_name) stored on the shard of their customer
+SHARDED_MODELS = {'customer', 'loan', 'emiobligation'}
+
+
+def sharding_enabled():
+    return bool(settings.LOAN_SHARDS)
+
+
+def shard_aliases():
+    """
+    Database aliases holding customers and their loans, in shard order. Just
+    the default database when sharding is off.
+    """
+    return [f'shard_{index}' for index in range(len(settings.LOAN_SHARDS))] or [DEFAULT_DB_ALIAS]
+
+
+def shard_for_customer(customer_id):
+    """
+    Database alias of the shard that owns a customer ID.
+    """
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    aliases = shard_aliases()
+    if settings.LOAN_SHARD_STRATEGY == 'range':
+        index = (int(customer_id) - 1) // settings.LOAN_SHARD_RANGE_SIZE
+        return aliases[min(max(index, 0), len(aliases) - 1)]
+    return aliases[int(customer_id) % len(aliases)]
+
+
+def is_sharded_model(model):
+    return model._meta.app_label == 'loans' and model._meta.model_name in SHARDED_MODELS
+
+
+class CustomerShardRouter:
+    """
+    Database router installed when LOAN_SHARDS is set. Customer-scoped models
+    go to the shard of the customer_id of the instance they are accessed
+    through (e.g. customer.loans, loan.customer, instance.save()); queries
+    without an instance have to pick their shard with .using(). All other
+    models stay in the default database.
+    """
+
+    def _db_for_model(self, model, **hints):
+        if not is_sharded_model(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db:
+            return instance._state.db
+        customer_id = getattr(instance, 'customer_id', None)
+        return shard_for_customer(customer_id) if customer_id is not None else None
+
+    db_for_read = _db_for_model
+    db_for_write = _db_for_model
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'loans' and model_name in SHARDED_MODELS:
+            return db in shard_aliases()
+        return db == DEFAULT_DB_ALIAS
+
+
+def _call_and_close(fn, alias):
+    try:
+        return fn(alias)
+    finally:
+        connections.close_all()
+
+
+def scatter(fn, aliases=None, parallel=True):
+    """
+    Call fn(alias) for every shard and return the results in shard order.
+
+    With several shards and parallel=True the calls run in parallel threads,
+    each opening (and afterwards closing) its own connections, unless the
+    caller has a transaction open on one of the shards: the threads would
+    not see its uncommitted writes. Request-path lookups pass
+    parallel=False, where reusing the thread's persistent connections is
+    cheaper than connection setup on every shard.
+    """
+    aliases = list(aliases or shard_aliases())
+    if not parallel or len(aliases) == 1 or any(connections[alias].in_atomic_block for alias in aliases):
+        return [fn(alias) for alias in aliases]
+    with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+        return list(executor.map(_call_and_close, [fn] * len(aliases), aliases))
+
+
+class MergedQuerySet:
+    """
+    The same query run on several shards, merged in key order (which must
+    match the querysets' order_by). Supports count(), slicing and iteration,
+    which is what Paginator needs. A slice [start:stop] reads at most stop
+    rows from each shard. Shards are queried one after another on the
+    request's connections (see scatter).
+    """
+    ordered = True
+
+    def __init__(self, querysets, key):
+        self.querysets = querysets
+        self.key = key
+
+    def count(self):
+        return sum(scatter(lambda alias: self.querysets[alias].count(), self.querysets, parallel=False))
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return heapq.merge(*(queryset.iterator() for queryset in self.querysets.values()), key=self.key)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            return list(islice(iter(self), start, None))
+        rows = scatter(lambda alias: list(self.querysets[alias][:stop]), self.querysets, parallel=False)
+        return list(islice(heapq.merge(*rows, key=self.key), start, stop))
+
+
+def on_every_shard(build, key):
+    """
+    Build a queryset per shard with build(alias). Returns the queryset itself
+    when there is a single database, otherwise a MergedQuerySet.
+    """
+    querysets = {alias: build(alias) for alias in shard_aliases()}
+    if len(querysets) == 1:
+        return next(iter(querysets.values()))
+    return MergedQuerySet(querysets, key)
+
+
+def get_from_shards(queryset, **lookup):
+    """
+    The object matching lookup on whichever shard has it. Shards are tried
+    in order on the current thread's connections, stopping at the first
+    match.
+
+    Raises:
+        queryset.model.DoesNotExist: if no shard has a match
+    """
+    for alias in shard_aliases():
+        obj = queryset.using(alias).filter(**lookup).first()
+        if obj is not None:
+            return obj
+    raise queryset.model.DoesNotExist(f"{queryset.model._meta.object_name} matching {lookup} does not exist.")
+
+
+def group_by_shard(objects):
+    """
+    Split customer-scoped objects into {alias: [objects]} by their customer_id.
+    """
+    groups = defaultdict(list)
+    for obj in objects:
+        groups[shard_for_customer(obj.customer_id)].append(obj)
+    return dict(groups)
+
+
+def highest_id(model):
+    """
+    The largest primary key of a sharded model across all shards.
+    """
+    return max(
+        (value or 0 for value in scatter(
+            lambda alias: model.objects.using(alias).aggregate(highest=Max('pk'))['highest']
+        )),
+        default=0
+    )
+
+
+def allocate_ids(model, count=1):
+    """
+    Reserve count consecutive primary keys for a sharded model. The counter
+    row in the default database is locked by the UPDATE until the
+    transaction commits, so concurrent callers get disjoint ranges. It is
+    seeded from the highest existing ID on first use.
+
+    Returns:
+        range: the reserved IDs
+    """
+    name = model._meta.label_lower
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if not IdSequence.objects.filter(name=name).update(next_value=F('next_value') + count):
+            IdSequence.objects.get_or_create(name=name, defaults={'next_value': highest_id(model) + 1})
+            IdSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        next_value = IdSequence.objects.get(name=name).next_value
+    return range(next_value - count, next_value)
+
+
+def assign_global_ids(model, objects):
+    """
+    Give unsaved objects of a sharded model globally unique primary keys.
+    A no-op without sharding, where the database sequence assigns them.
+    """
+    if not sharding_enabled():
+        return objects
+    unassigned = [obj for obj in objects if obj.pk is None]
+    if not unassigned:
+        return objects
+    for obj, pk in zip(unassigned, allocate_ids(model, len(unassigned))):
+        obj.pk = pk
+    return objects
+
+
+def shard_for_save(instance, using=None):
+    """
+    Database a customer or loan is saved to. When sharded, a new instance
+    first gets a globally unique ID, and the default database (which
+    QuerySet.create() passes explicitly, but never holds sharded tables) is
+    replaced by the customer's shard.
+    """
+    if not sharding_enabled():
+        return using
+    if instance._state.adding and instance.pk is None:
+        assign_global_ids(type(instance), [instance])
+    if using in (None, DEFAULT_DB_ALIAS):
+        return shard_for_customer(instance.customer_id)
+    return using
+
+
+def sync_id_sequences(models):
+    """
+    Move the ID counters past IDs inserted explicitly, e.g. by the ingest.
+    """
+    if not sharding_enabled():
+        return
+    for model in models:
+        name = model._meta.label_lower
+        highest = highest_id(model)
+        IdSequence.objects.filter(name=name, next_value__lte=highest).update(next_value=highest + 1)
+        IdSequence.objects.get_or_create(name=name, defaults={'next_value': highest + 1})
@@ -1,13 +1,66 @@
-from django.db.models.signals import post_migrate
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
-from loans.tasks import load_initial_data
+from loans.audit import decision_log
 
 
 @receiver(post_migrate)
-def trigger_initial_data_load(sender, **kwargs):
+def trigger_initial_data_load(sender, using=DEFAULT_DB_ALIAS, **kwargs):
     """
     Trigger the initial data load task after migrations have completed.
+    Opt-in through LOAD_INITIAL_DATA_ON_MIGRATE; otherwise run
+    `manage.py load_initial_data` explicitly.
     """
-    if sender.name == 'loans':
+    if sender.name == 'loans' and using == DEFAULT_DB_ALIAS and settings.LOAD_INITIAL_DATA_ON_MIGRATE:
+        from loans.tasks import load_initial_data
+
         # Schedule the data loading task
-        load_initial_data.delay()
\ No newline at end of file
+        load_initial_data.delay()
+
+
+@worker_process_shutdown.connect
+def flush_decision_log(**kwargs):
+    """
+    Flush buffered decision log entries before a Celery worker process exits.
+    Prefork children skip atexit handlers, so the buffer is flushed explicitly.
+    """
+    decision_log.shutdown()
+
+
+@receiver(post_migrate)
+def create_upcoming_loan_partitions(sender, using='default', **kwargs):
+    """
+    Make sure the partitioned loan table has partitions for the coming years.
+    """
+    if sender.name == 'loans' and router.allow_migrate_model(using, sender.get_model('Loan')):
+        from loans.partitioning import ensure_loan_partitions
+
+        ensure_loan_partitions(using=using)
+
+
+@receiver(post_save, sender='loans.Loan')
+def record_emi_obligations(sender, instance, created, raw, using, update_fields=None, **kwargs):
+    """
+    Add a new loan to its customer's EMI obligation timeline, or recompute the
+    timeline when a saved loan's dates or repayment may have changed.
+    """
+    if raw:
+        return
+    from loans.obligations import TIMELINE_FIELDS, rebuild_emi_obligations, record_loan
+
+    if created:
+        record_loan(instance, using=using)
+    elif update_fields is None or TIMELINE_FIELDS.intersection(update_fields):
+        rebuild_emi_obligations([instance.customer_id], using=using)
+
+
+@receiver(post_delete, sender='loans.Loan')
+def release_emi_obligations(sender, instance, using, **kwargs):
+    """
+    Remove a deleted loan from its customer's EMI obligation timeline.
+    """
+    from loans.obligations import release_loan
+
+    release_loan(instance, using=using)
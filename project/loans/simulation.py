@@ -0,0 +1,250 @@
+import itertools
+from dataclasses import dataclass
+from datetime import date
+from dateutil.relativedelta import relativedelta
+
+import numpy as np
+from django.db.models import Count, Max, Q, Sum
+
+from .models import Customer, EmiObligation, Loan
+from .obligations import month_start
+from .sharding import scatter
+from .utils import APPROVAL_SCORE_THRESHOLD, MAX_EMI_TO_SALARY_RATIO, RATE_FLOOR_BANDS, year_overlap_q
+
+
+@dataclass(frozen=True)
+class EligibilityPolicy:
+    """
+    One set of eligibility thresholds, mirroring the constants in loans.utils.
+    """
+    approval_score_threshold: int = APPROVAL_SCORE_THRESHOLD
+    rate_floor_bands: tuple = tuple((lower, float(rate)) for lower, rate in RATE_FLOOR_BANDS)
+    max_emi_to_salary_ratio: float = float(MAX_EMI_TO_SALARY_RATIO)
+
+    def describe(self):
+        bands = ','.join(f'{lower}:{rate:g}' for lower, rate in self.rate_floor_bands)
+        return f'score>{self.approval_score_threshold} bands={bands} emi<={self.max_emi_to_salary_ratio:g}'
+
+
+@dataclass
+class CreditProfiles:
+    """
+    Columnar credit profiles, one entry per customer ordered by customer_id.
+    peak_emi is the highest monthly EMI total over the tenure the profiles
+    were loaded for.
+    """
+    customer_id: np.ndarray
+    monthly_salary: np.ndarray
+    approved_limit: np.ndarray
+    credit_score: np.ndarray
+    peak_emi: np.ndarray
+    tenure: int = 0
+
+    def __len__(self):
+        return len(self.customer_id)
+
+
+@dataclass
+class SimulationResult:
+    policy: EligibilityPolicy
+    customers: int
+    approved: int
+    rate_corrected: int
+    exposure: float
+    monthly_installments: float
+    approval_rate_delta: float = 0.0
+    exposure_delta: float = 0.0
+
+    @property
+    def approval_rate(self):
+        return self.approved / self.customers if self.customers else 0.0
+
+
+def score_credit_profiles(total_tenure, emis_paid_on_time, loan_count, current_year_count,
+                          total_amount, active_amount, approved_limit):
+    """
+    Vectorized counterpart of utils.calculate_credit_score.
+    """
+    on_time_ratio = np.divide(
+        emis_paid_on_time, total_tenure,
+        out=np.zeros(len(total_tenure)), where=total_tenure > 0
+    )
+    on_time_score = np.minimum(30, np.floor(on_time_ratio * 30))
+    loan_count_score = np.minimum(15, loan_count * 3)
+    current_year_score = np.minimum(20, current_year_count * 5)
+    volume_score = np.select(
+        [total_amount > 1000000, total_amount > 500000, total_amount > 100000, total_amount > 0],
+        [20, 15, 10, 5],
+        default=0
+    )
+    limit_score = np.where(active_amount > approved_limit, 0, 15)
+
+    score = on_time_score + loan_count_score + current_year_score + volume_score + limit_score
+    # Customers without any loan history get the default moderate score
+    return np.where(loan_count > 0, score, 50).astype(np.int64)
+
+
+def _load_shard_rows(alias, as_of, tenure, chunk_size):
+    customers = Customer.objects.using(alias).order_by('customer_id').values_list(
+        'customer_id', 'monthly_salary', 'approved_limit'
+    )
+    customer_rows = np.array(list(customers.iterator(chunk_size=chunk_size)), dtype=np.int64).reshape(-1, 3)
+
+    active = Q(end_date__gte=as_of)
+    aggregates = Loan.objects.using(alias).values('customer_id').order_by('customer_id').annotate(
+        total_tenure=Sum('tenure'),
+        emis_paid_on_time=Sum('emis_paid_on_time'),
+        loan_count=Count('loan_id'),
+        current_year_count=Count('loan_id', filter=year_overlap_q(as_of.year)),
+        total_amount=Sum('loan_amount'),
+        active_amount=Sum('loan_amount', filter=active),
+    ).values_list(
+        'customer_id', 'total_tenure', 'emis_paid_on_time', 'loan_count',
+        'current_year_count', 'total_amount', 'active_amount'
+    )
+    loan_rows = np.array(
+        [[float(value or 0) for value in row] for row in aggregates.iterator(chunk_size=chunk_size)],
+        dtype=np.float64
+    ).reshape(-1, 7)
+
+    # Same months as obligations.peak_emi for a loan taken on as_of
+    this_month = month_start(as_of)
+    peaks = EmiObligation.objects.using(alias).filter(
+        month__gte=this_month + relativedelta(months=1), month__lte=this_month + relativedelta(months=tenure)
+    ).values('customer_id').order_by('customer_id').annotate(peak_emi=Max('total_emi')).values_list(
+        'customer_id', 'peak_emi'
+    )
+    peak_rows = np.array(
+        [[float(value) for value in row] for row in peaks.iterator(chunk_size=chunk_size)],
+        dtype=np.float64
+    ).reshape(-1, 2)
+    return customer_rows, loan_rows, peak_rows
+
+
+def load_credit_profiles(as_of=None, tenure=0, chunk_size=10000):
+    """
+    Load every customer's credit profile with three streaming queries per
+    shard. EMI burdens come from the obligation timelines (loans.obligations)
+    over the months of a tenure-month loan, so they are only valid for
+    simulating that tenure.
+    """
+    as_of = as_of or date.today()
+
+    shard_rows = scatter(lambda alias: _load_shard_rows(alias, as_of, tenure, chunk_size))
+    customer_rows = np.concatenate([customers for customers, _, _ in shard_rows])
+    loan_rows = np.concatenate([loans for _, loans, _ in shard_rows])
+    peak_rows = np.concatenate([peaks for _, _, peaks in shard_rows])
+    # Shards hold interleaved customer ID ranges; searchsorted needs them in order
+    customer_rows = customer_rows[np.argsort(customer_rows[:, 0], kind='stable')]
+    customer_id = customer_rows[:, 0]
+    approved_limit = customer_rows[:, 2].astype(np.float64)
+
+    columns = np.zeros((len(customer_id), 6))
+    if len(loan_rows):
+        positions = np.searchsorted(customer_id, loan_rows[:, 0].astype(np.int64))
+        columns[positions] = loan_rows[:, 1:]
+    total_tenure, emis_paid, loan_count, current_year_count, total_amount, active_amount = columns.T
+    peak_emi = np.zeros(len(customer_id))
+    if len(peak_rows):
+        peak_emi[np.searchsorted(customer_id, peak_rows[:, 0].astype(np.int64))] = peak_rows[:, 1]
+
+    return CreditProfiles(
+        customer_id=customer_id,
+        monthly_salary=customer_rows[:, 1].astype(np.float64),
+        approved_limit=approved_limit,
+        credit_score=score_credit_profiles(
+            total_tenure, emis_paid, loan_count, current_year_count,
+            total_amount, active_amount, approved_limit
+        ),
+        peak_emi=peak_emi,
+        tenure=tenure,
+    )
+
+
+def monthly_installments(loan_amount, interest_rate, tenure):
+    """
+    Vectorized counterpart of utils.calculate_monthly_installment (in floats).
+    """
+    loan_amount = np.asarray(loan_amount, dtype=np.float64)
+    monthly_rate = float(interest_rate) / 100 / 12
+    if monthly_rate == 0:
+        return loan_amount / tenure
+    term = (1 + monthly_rate) ** tenure
+    return np.round(loan_amount * monthly_rate * term / (term - 1), 2)
+
+
+def simulate_policy(profiles, policy, loan_amount, interest_rate, tenure):
+    """
+    Re-run the approval and rate-correction decisions for every customer.
+
+    Args:
+        profiles: CreditProfiles from load_credit_profiles for the same tenure
+        policy: EligibilityPolicy to evaluate
+        loan_amount: requested amount, a scalar or one value per customer
+        interest_rate: requested annual interest rate in percentage
+        tenure: requested tenure in months
+
+    Raises:
+        ValueError: if the profiles were loaded for another tenure
+    """
+    if tenure != profiles.tenure:
+        raise ValueError(f'Profiles were loaded for a {profiles.tenure} month tenure, not {tenure}.')
+    loan_amount = np.broadcast_to(np.asarray(loan_amount, dtype=np.float64), profiles.customer_id.shape)
+    score = profiles.credit_score
+    installment = monthly_installments(loan_amount, interest_rate, tenure)
+
+    affordable = profiles.peak_emi + installment <= profiles.monthly_salary * policy.max_emi_to_salary_ratio
+    approved = affordable & (score > policy.approval_score_threshold)
+    final_installment = np.where(approved, installment, 0.0)
+    rate_corrected = np.zeros(len(profiles), dtype=bool)
+
+    undecided = affordable & ~approved
+    for lower_bound, minimum_rate in policy.rate_floor_bands:
+        in_band = undecided & (score > lower_bound)
+        undecided &= ~in_band
+        approved |= in_band
+        if minimum_rate > float(interest_rate):
+            rate_corrected |= in_band
+            final_installment = np.where(
+                in_band, monthly_installments(loan_amount, minimum_rate, tenure), final_installment
+            )
+        else:
+            final_installment = np.where(in_band, installment, final_installment)
+
+    return SimulationResult(
+        policy=policy,
+        customers=len(profiles),
+        approved=int(approved.sum()),
+        rate_corrected=int(rate_corrected.sum()),
+        exposure=float(loan_amount[approved].sum()),
+        monthly_installments=float(final_installment.sum()),
+    )
+
+
+def policy_grid(approval_score_thresholds=None, rate_floor_bands=None, max_emi_to_salary_ratios=None):
+    """
+    Build the cartesian product of alternative thresholds, defaulting each axis to the live policy.
+    """
+    baseline = EligibilityPolicy()
+    return [
+        EligibilityPolicy(threshold, tuple(bands), ratio)
+        for threshold, bands, ratio in itertools.product(
+            approval_score_thresholds or [baseline.approval_score_threshold],
+            rate_floor_bands or [baseline.rate_floor_bands],
+            max_emi_to_salary_ratios or [baseline.max_emi_to_salary_ratio],
+        )
+    ]
+
+
+def simulate_policy_grid(profiles, policies, loan_amount, interest_rate, tenure, baseline=None):
+    """
+    Simulate every policy and report approval-rate and exposure deltas against the baseline.
+    """
+    baseline_result = simulate_policy(profiles, baseline or EligibilityPolicy(), loan_amount, interest_rate, tenure)
+    results = []
+    for policy in policies:
+        result = simulate_policy(profiles, policy, loan_amount, interest_rate, tenure)
+        result.approval_rate_delta = result.approval_rate - baseline_result.approval_rate
+        result.exposure_delta = result.exposure - baseline_result.exposure
+        results.append(result)
+    return baseline_result, results
@@ -1,88 +1,87 @@
 import os
-import pandas as pd
-from datetime import datetime, timedelta
-from celery import shared_task
-from django.conf import settings
-from django.db import transaction
-from .models import Customer, Loan
+from celery import chain, group, shared_task
+from django.db import DatabaseError
+from .ingest import (
+    INITIAL_DATA_JOB, data_file, ingest_progress, load_chunk, plan_ingest, remove_chunk_files, reset_sequences
+)
+from .models import Customer, IngestChunk, Loan
+from .obligations import rebuild_emi_obligations
+from .sharding import scatter, shard_aliases
+from . import partitioning
 
 
 @shared_task
-def load_initial_data():
+def load_initial_data(inline=False):
     """
     Background task to load initial customer and loan data from Excel files.
+
+    The files are split into checkpointed chunks (see loans.ingest). Customer
+    chunks are loaded in parallel by load_ingest_chunk subtasks, followed by
+    the loan chunks once every customer chunk has committed. Running the task
+    again resumes from the chunks that are not done yet. With inline=True the
+    chunks are loaded one after another in the current process.
+    """
+    # Check if data is already loaded outside of a tracked ingest job
+    if not IngestChunk.objects.filter(job=INITIAL_DATA_JOB).exists() and any(scatter(
+        lambda alias: Customer.objects.using(alias).exists() or Loan.objects.using(alias).exists()
+    )):
+        print("Data already loaded, skipping initialization...")
+        return "Data already loaded, skipping initialization."
+
+    # Check if files exist
+    if not all(os.path.exists(data_file(kind)) for kind, _ in IngestChunk.KINDS):
+        return "Data files not found. Please place the files in the data directory."
+
+    plan_ingest(INITIAL_DATA_JOB)
+    pending = IngestChunk.objects.filter(job=INITIAL_DATA_JOB).exclude(status=IngestChunk.DONE)
+    customer_chunks = list(pending.filter(kind=IngestChunk.CUSTOMERS).values_list('pk', flat=True))
+    loan_chunks = list(pending.filter(kind=IngestChunk.LOANS).values_list('pk', flat=True))
+    if not customer_chunks and not loan_chunks:
+        return "Data already loaded, skipping initialization."
+
+    if inline:
+        # Customers first so every loan's customer exists
+        for chunk_id in customer_chunks + loan_chunks:
+            load_chunk(chunk_id)
+        reset_sequences()
+        rebuild_emi_obligations()
+        remove_chunk_files(INITIAL_DATA_JOB)
+        return f"Successfully loaded initial data ({ingest_progress(INITIAL_DATA_JOB)['rows_done']} rows)"
+
+    steps = [
+        group(load_ingest_chunk.si(chunk_id) for chunk_id in chunk_ids)
+        for chunk_ids in (customer_chunks, loan_chunks) if chunk_ids
+    ]
+    chain(*steps, finalize_ingest.si(INITIAL_DATA_JOB)).apply_async()
+    return f"Scheduled {len(customer_chunks)} customer and {len(loan_chunks)} loan chunks"
+
+
+@shared_task(autoretry_for=(DatabaseError,), retry_backoff=True, max_retries=3)
+def load_ingest_chunk(chunk_id):
+    """
+    Load one checkpointed chunk of an ingest job.
+    """
+    return load_chunk(chunk_id)
+
+
+@shared_task
+def finalize_ingest(job):
+    """
+    Runs after every chunk of a job has loaded. The chunks' loans are
+    bulk-inserted, so their EMI obligation timelines are built here; the
+    chunk files are removed once the whole job is done.
+    """
+    reset_sequences()
+    rebuild_emi_obligations()
+    status = ingest_progress(job)['status']
+    if status == IngestChunk.DONE:
+        remove_chunk_files(job)
+    return status
+
+
+@shared_task
+def ensure_loan_partitions():
+    """
+    Periodic task creating the loan table's upcoming yearly partitions on every shard.
     """
-    try:
-        # Check if data is already loaded
-        if Customer.objects.exists() or Loan.objects.exists():
-            print("Data already loaded, skipping initialization...")
-            return "Data already loaded, skipping initialization."
-        
-        # Define file paths
-        customer_file = os.path.join(settings.BASE_DIR, 'data', 'customer_data.xlsx')
-        loan_file = os.path.join(settings.BASE_DIR, 'data', 'loan_data.xlsx')
-        
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(customer_file), exist_ok=True)
-        
-        # Check if files exist
-        if not os.path.exists(customer_file) or not os.path.exists(loan_file):
-            return "Data files not found. Please place the files in the data directory."
-        
-        # Load customer data
-        with transaction.atomic():
-            customer_df = pd.read_excel(customer_file)
-            
-            # Create customer records
-            customers = []
-            for _, row in customer_df.iterrows():
-                customer = Customer(
-                    customer_id=row['customer_id'],
-                    first_name=row['first_name'],
-                    last_name=row['last_name'],
-                    phone_number=row['phone_number'],
-                    monthly_salary=row['monthly_salary'],
-                    approved_limit=row['approved_limit'],
-                    current_debt=row.get('current_debt', 0)
-                )
-                customers.append(customer)
-            
-            # Bulk create customers
-            Customer.objects.bulk_create(customers)
-            
-            # Load loan data
-            loan_df = pd.read_excel(loan_file)
-            
-            # Create loan records
-            loans = []
-            for _, row in loan_df.iterrows():
-                # Convert date strings to date objects
-                start_date = pd.to_datetime(row['start_date']).date() if pd.notna(row['start_date']) else datetime.now().date()
-                end_date = pd.to_datetime(row['end_date']).date() if pd.notna(row['end_date']) else (start_date + timedelta(days=30*row['tenure']))
-                
-                # Calculate repayments left
-                tenure = row['tenure']
-                emis_paid = row.get('EMIs paid on time', 0)
-                repayments_left = max(0, tenure - emis_paid)
-                
-                loan = Loan(
-                    loan_id=row['loan_id'],
-                    customer_id=row['customer_id'],
-                    loan_amount=row['loan_amount'],
-                    tenure=tenure,
-                    interest_rate=row['interest_rate'],
-                    monthly_repayment=row['monthly_repayment'],
-                    emis_paid_on_time=emis_paid,
-                    start_date=start_date,
-                    end_date=end_date,
-                    repayments_left=repayments_left
-                )
-                loans.append(loan)
-            
-            # Bulk create loans
-            Loan.objects.bulk_create(loans)
-        
-        return "Successfully loaded initial data"
-    
-    except Exception as e:
-        return f"Error loading initial data: {str(e)}"
\ No newline at end of file
+    return [name for alias in shard_aliases() for name in partitioning.ensure_loan_partitions(using=alias)]
@@ -1,12 +1,30 @@
-from django.test import TestCase
+from unittest import skipUnless
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from decimal import Decimal
-from .models import Customer, Loan
+from .models import Customer, Loan, DecisionLog
 from datetime import date, timedelta
 
+
+def count_on_shards(model, **lookup):
+    """
+    Rows of a customer-scoped model matching lookup on every shard (just the default database when unsharded).
+    """
+    from .sharding import scatter
+    return sum(scatter(lambda alias: model.objects.using(alias).filter(**lookup).count()))
+
+
+def get_on_shards(model, **lookup):
+    from .sharding import get_from_shards
+    return get_from_shards(model.objects.all(), **lookup)
+
+
 class CustomerRegistrationTests(APITestCase):
+    databases = '__all__'
+
     def test_customer_registration(self):
         """Test customer registration endpoint"""
         url = reverse('register')
@@ -19,10 +37,13 @@ class CustomerRegistrationTests(APITestCase):
         }
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Customer.objects.count(), 1)
+        self.assertEqual(count_on_shards(Customer), 1)
         self.assertEqual(response.data['approved_limit'], 1800000)  # 36 * 50000
 
+@override_settings(DECISION_LOG_WRITE_BEHIND=False)
 class LoanEligibilityTests(APITestCase):
+    databases = '__all__'
+
     def setUp(self):
         self.customer = Customer.objects.create(
             first_name='John',
@@ -46,8 +67,12 @@ class LoanEligibilityTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('approval', response.data)
         self.assertIn('monthly_installment', response.data)
+        self.assertEqual(DecisionLog.objects.filter(decision_type=DecisionLog.ELIGIBILITY_CHECK).count(), 1)
 
+@override_settings(DECISION_LOG_WRITE_BEHIND=False)
 class LoanCreationTests(APITestCase):
+    databases = '__all__'
+
     def setUp(self):
         self.customer = Customer.objects.create(
             first_name='John',
@@ -71,8 +96,12 @@ class LoanCreationTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(response.data['loan_approved'])
         self.assertIsNotNone(response.data['loan_id'])
+        log = DecisionLog.objects.get(decision_type=DecisionLog.LOAN_CREATION)
+        self.assertEqual(log.loan_id, response.data['loan_id'])
 
 class LoanViewTests(APITestCase):
+    databases = '__all__'
+
     def setUp(self):
         self.customer = Customer.objects.create(
             first_name='John',
@@ -105,4 +134,1264 @@ class LoanViewTests(APITestCase):
         url = reverse('view-loans', args=[self.customer.customer_id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data), 1)
+
+class BulkCustomerRegistrationTests(APITestCase):
+    databases = '__all__'
+
+    def test_batch_registration_json(self):
+        """Test bulk registration returns IDs in input order with per-row errors"""
+        url = reverse('register-batch')
+        data = [
+            {'first_name': 'John', 'last_name': 'Doe', 'age': 30, 'monthly_salary': 50000, 'phone_number': '1234567890'},
+            {'first_name': 'Jane', 'last_name': 'Doe', 'age': 17, 'monthly_salary': 40000, 'phone_number': '1234567891'},
+            {'first_name': 'Jim', 'last_name': 'Beam', 'age': 45, 'monthly_salary': 123456, 'phone_number': '1234567892'},
+        ]
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        customer_ids = response.data['customer_ids']
+        self.assertIsNone(customer_ids[1])
+        self.assertEqual(response.data['errors'], [{'row': 1, 'errors': {'age': ['Ensure this value is greater than or equal to 18.']}}])
+        self.assertEqual(get_on_shards(Customer, customer_id=customer_ids[0]).first_name, 'John')
+        self.assertEqual(get_on_shards(Customer, customer_id=customer_ids[0]).approved_limit, 1800000)
+        self.assertEqual(get_on_shards(Customer, customer_id=customer_ids[2]).approved_limit, 4500000)
+
+    def test_batch_registration_salary_bounds(self):
+        """Test salaries whose approved limit would be zero or overflow are per-row errors"""
+        row = {'first_name': 'John', 'last_name': 'Doe', 'age': 30, 'phone_number': '1234567890'}
+        data = [dict(row, monthly_salary=0), dict(row, monthly_salary=59650001), dict(row, monthly_salary=59650000)]
+        response = self.client.post(reverse('register-batch'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['customer_ids'][:2], [None, None])
+        self.assertEqual([error['row'] for error in response.data['errors']], [0, 1])
+        self.assertEqual(get_on_shards(Customer, customer_id=response.data['customer_ids'][2]).approved_limit, 2147400000)
+
+    def test_batch_registration_csv(self):
+        """Test bulk registration from a CSV upload"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        url = reverse('register-batch')
+        upload = SimpleUploadedFile('customers.csv', (
+            b'first_name,last_name,age,monthly_salary,phone_number\n'
+            b'John,Doe,30,50000,1234567890\n'
+            b'Jane,Doe,31,abc,1234567891\n'
+        ), content_type='text/csv')
+        response = self.client.post(url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(count_on_shards(Customer), 1)
+        self.assertIsNone(response.data['customer_ids'][1])
+        self.assertIn('monthly_salary', response.data['errors'][0]['errors'])
+
+    def test_batch_registration_csv_bad_encoding(self):
+        """Test a CSV upload that is not UTF-8 is rejected as a bad request"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        upload = SimpleUploadedFile('customers.csv', (
+            b'first_name,last_name,age,monthly_salary,phone_number\n'
+            b'Jos\xe9,Doe,30,50000,1234567890\n'
+        ), content_type='text/csv')
+        response = self.client.post(reverse('register-batch'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('UTF-8', response.data['error'])
+        self.assertEqual(count_on_shards(Customer), 0)
+
+    def test_vectorized_limits_match_scalar(self):
+        """Test the vectorized approved limit matches the model formula"""
+        from .models import calculate_approved_limit
+        from .onboarding import calculate_approved_limits
+        salaries = list(range(0, 500000, 997)) + [2777, 2778, 100000 // 36 * 36]
+        self.assertEqual(list(calculate_approved_limits(salaries)), [calculate_approved_limit(s) for s in salaries])
+
+
+class PolicySimulationTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.customers = []
+        for index, (salary, paid) in enumerate([(50000, 12), (40000, 0), (90000, 6)]):
+            customer = Customer.objects.create(
+                first_name=f'Customer{index}',
+                last_name='Doe',
+                age=30,
+                monthly_salary=salary,
+                phone_number='1234567890',
+                approved_limit=36 * salary
+            )
+            Loan.objects.create(
+                customer=customer,
+                loan_amount=200000 * (index + 1),
+                interest_rate=10,
+                tenure=12,
+                monthly_repayment=0,
+                emis_paid_on_time=paid,
+                start_date=date.today() - timedelta(days=400 * index),
+                end_date=date.today(),
+                repayments_left=12
+            )
+            self.customers.append(customer)
+        self.customers.append(Customer.objects.create(
+            first_name='New',
+            last_name='Customer',
+            age=25,
+            monthly_salary=30000,
+            phone_number='1234567890',
+            approved_limit=1100000
+        ))
+
+    def test_baseline_matches_determine_loan_eligibility(self):
+        """Test the vectorized baseline policy reproduces per-request decisions"""
+        from .simulation import EligibilityPolicy, load_credit_profiles, simulate_policy
+        from .utils import calculate_credit_score, determine_loan_eligibility
+        profiles = load_credit_profiles(tenure=24)
+        self.assertEqual(
+            list(profiles.credit_score),
+            [calculate_credit_score(customer) for customer in self.customers]
+        )
+        for interest_rate in (Decimal('8.00'), Decimal('14.00'), Decimal('20.00')):
+            decisions = [
+                determine_loan_eligibility(customer, Decimal('150000'), interest_rate, 24)
+                for customer in self.customers
+            ]
+            result = simulate_policy(profiles, EligibilityPolicy(), 150000, interest_rate, 24)
+            self.assertEqual(result.approved, sum(approval for approval, _, _ in decisions))
+            self.assertEqual(result.rate_corrected, sum(rate != interest_rate for _, rate, _ in decisions))
+            self.assertAlmostEqual(
+                result.monthly_installments,
+                float(sum(emi for approval, _, emi in decisions if approval)),
+                places=2
+            )
+
+    def test_simulate_policy_command(self):
+        """Test the simulate_policy management command reports every policy in the grid"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command(
+            'simulate_policy', '--tenure', '24', '--interest-rate', '10', '--limit-fraction', '0.1',
+            '--approval-threshold', '40', '60', '--emi-ratio', '0.4', '0.5', stdout=out
+        )
+        self.assertEqual(out.getvalue().count('approval rate'), 5)
+
+
+class DecisionLogBufferTests(TestCase):
+    def record(self, buffer, customer_id):
+        buffer.record(
+            decision_type=DecisionLog.ELIGIBILITY_CHECK,
+            customer_id=customer_id,
+            loan_amount=Decimal('100000'),
+            interest_rate=Decimal('12.50'),
+            corrected_interest_rate=Decimal('12.50'),
+            tenure=12,
+            monthly_installment=Decimal('8908.29'),
+            approved=True
+        )
+
+    @override_settings(DECISION_LOG_BATCH_SIZE=10, DECISION_LOG_MAX_BUFFER=5, DECISION_LOG_FLUSH_INTERVAL=3600)
+    def test_buffer_applies_backpressure_and_flushes(self):
+        """Test entries are buffered, flushed inline when full and on shutdown"""
+        from unittest import mock
+        from .audit import DecisionLogBuffer
+        buffer = DecisionLogBuffer()
+        # Keep the flusher thread out of the test transaction
+        with mock.patch.object(DecisionLogBuffer, '_ensure_started'):
+            for customer_id in range(7):
+                self.record(buffer, customer_id)
+            self.assertEqual(DecisionLog.objects.count(), 5)
+            self.assertEqual(buffer.stats()['backpressure_flushes'], 1)
+            self.assertEqual(buffer.stats()['buffered'], 2)
+            buffer.shutdown()
+        self.assertEqual(list(DecisionLog.objects.order_by('id').values_list('customer_id', flat=True)), list(range(7)))
+        self.assertEqual(buffer.stats()['written'], 7)
+
+    def test_entries_are_append_only(self):
+        """Test saved decision log entries cannot be modified or deleted"""
+        from django.core.exceptions import ValidationError
+        with override_settings(DECISION_LOG_WRITE_BEHIND=False):
+            from .audit import DecisionLogBuffer
+            self.record(DecisionLogBuffer(), 1)
+        log = DecisionLog.objects.get()
+        log.approved = False
+        with self.assertRaises(ValidationError):
+            log.save()
+        with self.assertRaises(ValidationError):
+            log.delete()
+        with self.assertRaises(ValidationError):
+            DecisionLog.objects.update(approved=False)
+        with self.assertRaises(ValidationError):
+            DecisionLog.objects.all().delete()
+
+    @override_settings(DECISION_LOG_BATCH_SIZE=10, DECISION_LOG_MAX_BUFFER=3, DECISION_LOG_FLUSH_INTERVAL=3600)
+    def test_failing_database_keeps_buffer_bounded(self):
+        """Test a buffer that cannot be flushed drops its oldest entries instead of growing or raising"""
+        from unittest import mock
+        from django.db import OperationalError
+        from .audit import DecisionLogBuffer
+        buffer = DecisionLogBuffer()
+        with mock.patch.object(DecisionLogBuffer, '_ensure_started'), \
+                mock.patch.object(DecisionLog.objects, 'bulk_create', side_effect=OperationalError('down')), \
+                self.assertLogs('loans.audit', 'WARNING'):
+            for customer_id in range(5):
+                self.record(buffer, customer_id)
+        stats = buffer.stats()
+        self.assertEqual(stats['buffered'], 3)
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['failed_flushes'], 3)
+        buffer.flush()
+        self.assertEqual(list(DecisionLog.objects.order_by('id').values_list('customer_id', flat=True)), [2, 3, 4])
+
+    @override_settings(DECISION_LOG_WRITE_BEHIND=False)
+    def test_record_decision_does_not_raise(self):
+        """Test a failed audit write is logged instead of failing the request that made the decision"""
+        from unittest import mock
+        from django.db import OperationalError
+        from .audit import record_decision
+        with mock.patch.object(DecisionLog, 'save', side_effect=OperationalError('down')), \
+                self.assertLogs('loans.audit', 'ERROR'):
+            record_decision(DecisionLog.LOAN_CREATION, 1, Decimal('100000'), Decimal('12.50'),
+                            Decimal('12.50'), 12, Decimal('8908.29'), True, loan_id=1)
+        self.assertEqual(DecisionLog.objects.count(), 0)
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_threads_share_one_computation(self):
+        """Test concurrent callers for the same key wait for the in-flight computation"""
+        import threading
+        from .coalescing import SingleFlight
+        flight = SingleFlight('test')
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do(('customer', 1), compute)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do(('customer', 1), compute)))
+            for _ in range(4)
+        ]
+        for thread in followers:
+            thread.start()
+        while flight.stats()['coalesced'] < 4:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(results, [42] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()['saved'], 4)
+        # Nothing is cached once the computation has finished
+        self.assertEqual(flight.do(('customer', 1), lambda: 7), 7)
+
+    def test_asyncio_tasks_share_one_computation(self):
+        """Test concurrent asyncio tasks for the same key share one computation"""
+        import asyncio
+        from .coalescing import SingleFlight
+        flight = SingleFlight('test')
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'profile'
+
+        async def run():
+            return await asyncio.gather(*[flight.do_async(('customer', 1), compute) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(run()), ['profile'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()['coalesced'], 4)
+
+    def test_errors_propagate_to_waiters(self):
+        """Test a failed computation raises in the caller and is not cached"""
+        from .coalescing import SingleFlight
+        flight = SingleFlight('test')
+
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+
+    def test_remote_lock_is_renewed_and_never_causes_recomputation(self):
+        """Test the Redis lock is extended during a slow computation and an expired lock does not recompute"""
+        import time
+        from unittest import mock
+        from redis.exceptions import LockNotOwnedError
+        from .coalescing import SingleFlight
+        flight = SingleFlight('test', redis_url='redis://unused', lock_timeout=0.03)
+        client = mock.Mock()
+        client.get.return_value = None
+        lock = client.lock.return_value
+        lock.acquire.return_value = True
+        lock.release.side_effect = LockNotOwnedError('lock expired')
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 42
+
+        with mock.patch.object(flight, '_client', return_value=client), \
+                self.assertLogs('loans.coalescing', 'WARNING'):
+            self.assertEqual(flight.do('key', compute), 42)
+        self.assertEqual(len(calls), 1)
+        self.assertGreater(lock.reacquire.call_count, 0)
+        self.assertEqual(client.lock.call_args.kwargs['thread_local'], False)
+        client.set.assert_called_once()
+        self.assertEqual(flight.stats()['computations'], 1)
+        self.assertEqual(flight.stats()['remote_errors'], 1)
+
+
+class StartupTests(TestCase):
+    def test_boot_does_not_import_ingest_stack(self):
+        """Test django.setup() and the URLconf load without pandas or NumPy"""
+        import subprocess
+        import sys
+        from django.conf import settings
+        script = (
+            "import sys, django; django.setup(); import credit_system.urls; "
+            "print(sorted(name for name in ('pandas', 'numpy') if name in sys.modules))"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip(), '[]')
+
+    def test_startup_profile_command(self):
+        """Test the startup_profile command reports an import-time breakdown"""
+        import json
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('startup_profile', '--json', '--top', '5', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertGreater(report['total_ms'], 0)
+        self.assertIn('django', [package['package'] for package in report['packages']])
+
+    def test_migrate_does_not_enqueue_data_load_by_default(self):
+        """Test the post_migrate data load is opt-in"""
+        from unittest import mock
+        from django.apps import apps
+        from .signals import trigger_initial_data_load
+        with mock.patch('loans.tasks.load_initial_data.delay') as delay:
+            trigger_initial_data_load(sender=apps.get_app_config('loans'))
+            delay.assert_not_called()
+            with override_settings(LOAD_INITIAL_DATA_ON_MIGRATE=True):
+                trigger_initial_data_load(sender=apps.get_app_config('loans'))
+            delay.assert_called_once()
+
+
+class ResumableIngestTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        import os
+        import tempfile
+        import pandas as pd
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tempdir.name, 'data'))
+        pd.DataFrame({
+            'Customer ID': [1, 2, 3, 4, 5],
+            'First Name': ['A', 'B', 'C', 'D', 'E'],
+            'Last Name': ['X', 'Y', 'Z', 'X', 'Y'],
+            'Age': [30, 40, 50, 35, 45],
+            'Phone Number': [9000000001, 9000000002, 9000000003, 9000000004, 9000000005],
+            'Monthly Salary': [50000, 60000, 70000, 80000, 90000],
+            'Approved Limit': [1800000, 2200000, 2600000, 2900000, 3300000],
+        }).to_excel(os.path.join(self.tempdir.name, 'data', 'customer_data.xlsx'), index=False)
+        pd.DataFrame({
+            'Customer ID': [1, 2, 3, 4, 4],
+            'Loan ID': [11, 12, 13, 14, 14],
+            'Loan Amount': [100000, 200000, 300000, 400000, 400000],
+            'Tenure': [12, 24, 36, 48, 48],
+            'Interest Rate': [10.5, 11.0, 12.0, 13.0, 13.0],
+            'Monthly payment': [8815, 9321, 9964, 10731, 10731],
+            'EMIs paid on Time': [12, 20, 30, 10, 10],
+            'Date of Approval': pd.to_datetime(['2020-01-01'] * 5),
+            'End Date': pd.to_datetime(['2021-01-01', '2022-01-01', '2023-01-01', '2024-01-01', '2024-01-01']),
+        }).to_excel(os.path.join(self.tempdir.name, 'data', 'loan_data.xlsx'), index=False)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_failed_ingest_resumes_from_last_committed_chunk(self):
+        """Test a restarted ingest only reloads chunks that did not commit"""
+        from pathlib import Path
+        from unittest import mock
+        from . import ingest
+        from .models import IngestChunk
+        from .tasks import load_initial_data
+
+        def failing_build_loans(rows):
+            if rows[0]['loan_id'] == 13:
+                raise ValueError('corrupt row')
+            return original_build_loans(rows)
+
+        original_build_loans = ingest.build_loans
+        with override_settings(BASE_DIR=Path(self.tempdir.name), INGEST_CHUNK_SIZE=2):
+            with mock.patch.dict(ingest.CHUNK_LOADERS, {IngestChunk.LOANS: (Loan, failing_build_loans)}):
+                with self.assertRaises(ValueError):
+                    load_initial_data(inline=True)
+            self.assertEqual(count_on_shards(Customer), 5)
+            self.assertEqual(count_on_shards(Loan), 2)
+
+            response = self.client.get(reverse('ingest-status'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['status'], IngestChunk.FAILED)
+            self.assertEqual(response.data['rows'], 10)
+            self.assertEqual(response.data['rows_done'], 7)
+
+            reload_customers = mock.Mock(side_effect=AssertionError('reloaded customers'))
+            with mock.patch.dict(ingest.CHUNK_LOADERS, {IngestChunk.CUSTOMERS: (Customer, reload_customers)}):
+                load_initial_data(inline=True)
+            reload_customers.assert_not_called()
+
+        self.assertEqual(count_on_shards(Loan), 4)
+        self.assertEqual(get_on_shards(Customer, customer_id=3).age, 50)
+        response = self.client.get(reverse('ingest-status'))
+        self.assertEqual(response.data['status'], IngestChunk.DONE)
+        self.assertEqual(response.data['percent_done'], 100.0)
+        self.assertEqual(IngestChunk.objects.get(kind=IngestChunk.LOANS, start_row=2).attempts, 2)
+
+    def test_plan_reads_each_sheet_once(self):
+        """Test planning splits each sheet into chunk files in a single pass, which the chunks load from"""
+        from pathlib import Path
+        from unittest import mock
+        from . import ingest
+        from .models import IngestChunk
+        with override_settings(BASE_DIR=Path(self.tempdir.name)):
+            with mock.patch.object(ingest, 'iter_sheet_rows', wraps=ingest.iter_sheet_rows) as iter_sheet_rows:
+                ingest.plan_ingest(chunk_size=2)
+            self.assertEqual(iter_sheet_rows.call_count, 2)
+            chunks = IngestChunk.objects.filter(kind=IngestChunk.LOANS).order_by('start_row')
+            self.assertEqual([(chunk.start_row, chunk.end_row) for chunk in chunks], [(0, 2), (2, 4), (4, 5)])
+            rows = ingest.read_chunk_rows(chunks[1])
+            self.assertEqual([row['loan_id'] for row in rows], [13, 14])
+            self.assertEqual(rows[0]['monthly_repayment'], 9964)
+            self.assertEqual([loan.start_date for loan in ingest.build_loans(rows)], [date(2020, 1, 1)] * 2)
+
+    def test_plan_without_sheet_dimensions(self):
+        """Test sheets saved without a dimension record are split by their rows"""
+        import os
+        import re
+        import zipfile
+        from pathlib import Path
+        from . import ingest
+        from .models import IngestChunk
+        path = os.path.join(self.tempdir.name, 'data', 'customer_data.xlsx')
+        os.rename(path, f'{path}.orig')
+        with zipfile.ZipFile(f'{path}.orig') as original, zipfile.ZipFile(path, 'w') as copy:
+            for item in original.infolist():
+                data = original.read(item.filename)
+                if item.filename.startswith('xl/worksheets/'):
+                    data = re.sub(rb'<dimension [^>]*/>', b'', data)
+                copy.writestr(item, data)
+        with override_settings(BASE_DIR=Path(self.tempdir.name)):
+            ingest.plan_ingest(chunk_size=2)
+        self.assertEqual(sum(chunk.row_count for chunk in IngestChunk.objects.filter(kind=IngestChunk.CUSTOMERS)), 5)
+
+    def test_unknown_ingest_job(self):
+        """Test the ingest status endpoint for a job that was never planned"""
+        response = self.client.get(reverse('ingest-status'), {'job': 'missing'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LoanExportTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='John',
+            last_name='Doe',
+            age=30,
+            monthly_salary=50000,
+            phone_number='1234567890',
+            approved_limit=1800000
+        )
+        for year in (2021, 2022, 2023):
+            Loan.objects.create(
+                customer=self.customer,
+                loan_amount=Decimal('100000.50'),
+                interest_rate=12.5,
+                tenure=12,
+                monthly_repayment=0,
+                start_date=date(year, 3, 1),
+                end_date=date(year + 1, 3, 1),
+                repayments_left=12
+            )
+
+    def test_export_csv_streams_all_loans(self):
+        """Test the CSV export streams a header and one line per loan"""
+        response = self.client.get(reverse('export-loans'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['loan_id', 'customer_id', 'loan_amount'])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('100000.50', lines[1])
+
+    def test_export_ndjson_incremental_filter(self):
+        """Test NDJSON export with an inclusive/exclusive start_date window"""
+        import json
+        response = self.client.get(reverse('export-loans'), {
+            'export_format': 'ndjson', 'start_date_from': '2022-03-01', 'start_date_to': '2023-03-01'
+        })
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['start_date'] for row in rows], ['2022-03-01'])
+        self.assertEqual(rows[0]['customer_id'], self.customer.customer_id)
+
+    def test_export_rejects_invalid_format(self):
+        """Test an unknown export format is rejected"""
+        response = self.client.get(reverse('export-loans'), {'export_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_loans_command(self):
+        """Test the export_loans command writes the same rows in blocks"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('export_loans', '--chunk-size', '1', '--start-date-from', '2022-01-01', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class LoanPartitioningTests(TestCase):
+    databases = '__all__'
+
+    @skipUnless(settings.DATABASES['default']['ENGINE'].endswith('sqlite3'), 'SQLite only')
+    def test_partition_helpers_are_noops_on_sqlite(self):
+        """Test partition maintenance leaves an unpartitioned SQLite table alone"""
+        from django.db import connection
+        from .partitioning import ensure_loan_partitions, is_partitioned
+        self.assertFalse(is_partitioned(connection))
+        self.assertEqual(ensure_loan_partitions(), [])
+
+    def test_current_year_range_matches_year_lookup(self):
+        """Test the sargable current-year filter selects the same loans as __year lookups"""
+        from django.db.models import Q
+        from .utils import year_overlap_q
+        customer = Customer.objects.create(
+            first_name='John',
+            last_name='Doe',
+            age=30,
+            monthly_salary=50000,
+            phone_number='1234567890',
+            approved_limit=1800000
+        )
+        for start, end in [
+            (date(2023, 12, 31), date(2024, 1, 1)),
+            (date(2022, 1, 1), date(2023, 12, 31)),
+            (date(2024, 12, 31), date(2026, 1, 1)),
+            (date(2020, 5, 5), date(2025, 5, 5)),
+        ]:
+            Loan.objects.create(
+                customer=customer, loan_amount=1000, interest_rate=10, tenure=12, monthly_repayment=0,
+                start_date=start, end_date=end, repayments_left=12
+            )
+        loans = Loan.objects.using(customer._state.db)
+        for year in (2023, 2024, 2025):
+            self.assertEqual(
+                set(loans.filter(year_overlap_q(year))),
+                set(loans.filter(Q(start_date__year=year) | Q(end_date__year=year)))
+            )
+
+
+@skipUnless(
+    settings.DATABASES['default']['ENGINE'].endswith('postgresql') and settings.LOAN_PARTITIONING,
+    'Run against PostgreSQL with LOAN_PARTITIONING=true to test the partitioned loan table'
+)
+class PostgresPartitioningTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='John',
+            last_name='Doe',
+            age=30,
+            monthly_salary=50000,
+            phone_number='1234567890',
+            approved_limit=1800000
+        )
+        self.year = date.today().year
+
+    def create_loan(self, start_date):
+        return Loan.objects.create(
+            customer=self.customer, loan_amount=1000, interest_rate=10, tenure=12, monthly_repayment=0,
+            start_date=start_date, end_date=start_date, repayments_left=12
+        )
+
+    def test_migration_partitions_loan_table(self):
+        """Test migration 0005 converted the loan table and loans land in their start year's partition"""
+        from django.db import connection
+        from .partitioning import existing_partitions, is_partitioned, partition_name
+        self.assertTrue(is_partitioned(connection))
+        self.assertIn(partition_name(self.year + settings.LOAN_PARTITION_YEARS_AHEAD), existing_partitions(connection))
+        loan = self.create_loan(date(self.year, 3, 1))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT loan_id FROM {partition_name(self.year)}')
+            self.assertEqual(cursor.fetchall(), [(loan.loan_id,)])
+
+    def test_current_year_query_prunes_later_partitions(self):
+        """Test the current-year credit score filter does not scan the partitions of later years"""
+        from .partitioning import partition_name
+        from .utils import year_overlap_q
+        plan = Loan.objects.filter(year_overlap_q(self.year)).explain()
+        self.assertIn(partition_name(self.year), plan)
+        self.assertNotIn(partition_name(self.year + 1), plan)
+
+    def test_rebuilds_keep_rows_and_sequence(self):
+        """Test unpartitioning and partitioning again, as the migration does both ways, keeps loans and their IDs"""
+        from django.db import connection
+        from .partitioning import existing_partitions, is_partitioned, partition_loan_table, partition_name, unpartition_loan_table
+        loan_ids = {self.create_loan(date(self.year - 3, 6, 1)).loan_id, self.create_loan(date(self.year, 6, 1)).loan_id}
+        with connection.cursor() as cursor:
+            # ALTER TABLE refuses to run with the inserts' deferred foreign key checks pending
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        unpartition_loan_table(connection)
+        self.assertFalse(is_partitioned(connection))
+        self.assertEqual(set(Loan.objects.values_list('loan_id', flat=True)), loan_ids)
+
+        partition_loan_table(connection)
+        self.assertTrue(is_partitioned(connection))
+        self.assertIn(partition_name(self.year - 3), existing_partitions(connection))
+        self.assertEqual(set(Loan.objects.values_list('loan_id', flat=True)), loan_ids)
+        self.assertGreater(self.create_loan(date(self.year, 7, 1)).loan_id, max(loan_ids))
+
+
+class CustomerSearchTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        for first_name, last_name, phone_number in [
+            ('John', 'Smith', '+91 98765-43210'),
+            ('Johnny', 'Walker', '9123456789'),
+            ('Jane', 'Smithers', '9000000000'),
+            ('Bob', 'Jones', '9111111111'),
+        ]:
+            Customer.objects.create(
+                first_name=first_name,
+                last_name=last_name,
+                age=30,
+                monthly_salary=50000,
+                phone_number=phone_number,
+                approved_limit=1800000
+            )
+        self.url = reverse('customer-search')
+
+    def test_search_by_phone_number(self):
+        """Test phone numbers are matched on their digits"""
+        response = self.client.get(self.url, {'phone_number': '919876543210'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['name'], 'John Smith')
+
+    def test_search_by_name_prefix(self):
+        """Test every word of a name query matches a first or last name prefix"""
+        response = self.client.get(self.url, {'name': 'JOHN'})
+        self.assertEqual([c['name'] for c in response.data['results']], ['John Smith', 'Johnny Walker'])
+
+        response = self.client.get(self.url, {'name': 'smith'})
+        self.assertEqual([c['name'] for c in response.data['results']], ['John Smith', 'Jane Smithers'])
+
+        response = self.client.get(self.url, {'name': 'john smi'})
+        self.assertEqual([c['name'] for c in response.data['results']], ['John Smith'])
+
+    def test_search_is_paginated(self):
+        """Test search results are paginated"""
+        response = self.client.get(self.url, {'name': 'j', 'page_size': 2})
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_search_requires_one_criterion(self):
+        """Test a search needs exactly one of phone_number or name"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'name': 'john', 'phone_number': '9000000000'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_benchmark_only_touches_its_reserved_ids(self):
+        """Test the search benchmark needs --allow-writes and leaves customers registered during the run alone"""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import CommandError, call_command
+        from .management.commands import benchmark_customer_search
+        with self.assertRaises(CommandError):
+            call_command('benchmark_customer_search', '--customers', '10', stdout=StringIO())
+
+        reserve_customer_ids = benchmark_customer_search.reserve_customer_ids
+        reserved, registered = [], []
+
+        def reserve_then_register(count):
+            reserved.extend(reserve_customer_ids(count))
+            registered.append(Customer.objects.create(
+                first_name='New', last_name='Customer', age=30, monthly_salary=50000,
+                phone_number='9222222222', approved_limit=1800000
+            ))
+            return range(reserved[0], reserved[-1] + 1)
+
+        with mock.patch.object(benchmark_customer_search, 'reserve_customer_ids', side_effect=reserve_then_register):
+            call_command(
+                'benchmark_customer_search', '--allow-writes', '--customers', '10', '--queries', '2', stdout=StringIO()
+            )
+        self.assertEqual(len(reserved), 10)
+        self.assertGreater(registered[0].customer_id, reserved[-1])
+        self.assertEqual(count_on_shards(Customer), 5)
+
+
+@override_settings(DECISION_LOG_WRITE_BEHIND=False)
+class QueryBudgetTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth.models import User
+        from .models import IngestChunk
+        from .profiling import profile_store
+        self.customer = Customer.objects.create(
+            first_name='John',
+            last_name='Doe',
+            age=30,
+            monthly_salary=100000,
+            phone_number='1234567890',
+            approved_limit=3600000
+        )
+        self.loans = [
+            Loan.objects.create(
+                customer=self.customer,
+                loan_amount=100000,
+                interest_rate=12.5,
+                tenure=12,
+                monthly_repayment=8884.88,
+                emis_paid_on_time=12,
+                start_date=date.today() - timedelta(days=30 * months),
+                end_date=date.today() + timedelta(days=365),
+                repayments_left=12
+            )
+            for months in range(3)
+        ]
+        IngestChunk.objects.create(job='initial', kind=IngestChunk.CUSTOMERS, start_row=0, end_row=10)
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        profiling_dir = override_settings(REQUEST_PROFILING_DIR=self.tempdir.name)
+        profiling_dir.enable()
+        self.addCleanup(profiling_dir.disable)
+        self.profile_id = profile_store().save({
+            'method': 'GET', 'path': '/api/view-loans/1', 'status': 200, 'trigger': 'header',
+            'mode': 'deterministic', 'started_at': '2024-01-01T00:00:00+00:00', 'duration_ms': 1.0,
+            'functions': {}, 'sql': {'count': 0, 'total_ms': 0.0, 'timeline': []}, 'profile': [],
+        })
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        loan_request = {'customer_id': self.customer.customer_id, 'loan_amount': 100000, 'interest_rate': 12.5, 'tenure': 12}
+        registration = {'first_name': 'Jane', 'last_name': 'Roe', 'age': 30, 'monthly_salary': 50000, 'phone_number': '9876543210'}
+        self.requests = {
+            'register': ('post', [], registration),
+            'register-batch': ('post', [], [registration, dict(registration, first_name='Jim'), dict(registration, age=5)]),
+            'check-eligibility': ('post', [], loan_request),
+            'create-loan': ('post', [], loan_request),
+            'view-loan': ('get', [self.loans[0].loan_id], None),
+            'view-loans': ('get', [self.customer.customer_id], None),
+            'ingest-status': ('get', [], None),
+            'export-loans': ('get', [], None),
+            'customer-search': ('get', [], {'name': 'jo'}),
+            'profiles': ('get', [], None),
+            'profile-detail': ('get', [self.profile_id], None),
+            'metrics': ('get', [], None),
+        }
+
+    def record(self, name):
+        from .querycount import QueryRecorder
+        method, args, data = self.requests[name]
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(reverse(name, args=args), data, format='json' if method == 'post' else None)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, name)
+        return recorder
+
+    def test_every_route_has_a_budget(self):
+        """Test the query budget file covers every API route"""
+        from .querycount import load_query_budgets
+        from .urls import urlpatterns
+        names = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(set(load_query_budgets()), names)
+        self.assertEqual(set(self.requests), names)
+
+    def test_routes_stay_within_query_budget(self):
+        """Test each route issues no more queries than its budget and no repeated query shapes"""
+        from .querycount import load_query_budgets
+        from .sharding import sharding_enabled
+        for name, budget in load_query_budgets().items():
+            with self.subTest(route=name):
+                recorder = self.record(name)
+                # Budgets are for a single database; sharded routes add a query per shard and ID allocation
+                if not sharding_enabled():
+                    self.assertLessEqual(recorder.count, budget, [query['sql'] for query in recorder.queries])
+                self.assertEqual(recorder.repeated_queries(), [])
+
+    def test_repeated_queries_are_detected(self):
+        """Test queries differing only by parameters are reported as repeats"""
+        from .querycount import QueryRecorder, normalize_sql
+        with QueryRecorder() as recorder:
+            shard = self.customer._state.db
+            for loan in Loan.objects.using(shard):
+                Customer.objects.using(shard).get(pk=loan.customer_id)
+        self.assertEqual(recorder.repeated_queries(), [(normalize_sql(recorder.queries[1]['sql']), 3)])
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s) AND name = \'x\''),
+            normalize_sql('SELECT * FROM t WHERE id IN (%s) AND name = \'y\'')
+        )
+
+    @override_settings(DEBUG=True)
+    def test_debug_query_headers(self):
+        """Test DEBUG responses report the query count and database time"""
+        from .sharding import shard_aliases
+        response = self.client.get(reverse('view-loan', args=[self.loans[0].loan_id]))
+        # Loan details try the shards in order until the loan is found
+        self.assertEqual(response['X-DB-Query-Count'], str(shard_aliases().index(self.customer._state.db) + 1))
+        self.assertGreaterEqual(float(response['X-DB-Time-Ms']), 0)
+
+
+def reference_monthly_installment(loan_amount, interest_rate, tenure):
+    """
+    calculate_monthly_installment before its factors were cached.
+    """
+    monthly_rate = Decimal(interest_rate) / Decimal('100') / Decimal('12')
+    loan_amount = Decimal(loan_amount)
+    if monthly_rate == 0:
+        return loan_amount / Decimal(tenure)
+    numerator = loan_amount * monthly_rate * (1 + monthly_rate) ** tenure
+    denominator = (1 + monthly_rate) ** tenure - 1
+    return (numerator / denominator).quantize(Decimal('0.01'))
+
+
+class MonthlyInstallmentTests(TestCase):
+    AMOUNTS = [Decimal('1.00'), Decimal('73333.33'), Decimal('100000'), Decimal('2500000.55'), Decimal('999999999999.99')]
+
+    def test_matches_reference_over_rate_and_tenure_grid(self):
+        """Test cached EMI factors give identical installments for every two-decimal rate up to 30% and tenure up to 360 months"""
+        from .utils import calculate_monthly_installment
+        mismatches = []
+        for basis_points in range(0, 3001):
+            rate = Decimal(basis_points).scaleb(-2)
+            for tenure in range(1, 361):
+                amount = self.AMOUNTS[(basis_points + tenure) % len(self.AMOUNTS)]
+                expected = reference_monthly_installment(amount, rate, tenure)
+                actual = calculate_monthly_installment(amount, rate, tenure)
+                if actual != expected or actual.as_tuple().exponent != expected.as_tuple().exponent:
+                    mismatches.append((amount, rate, tenure, expected, actual))
+        self.assertEqual(mismatches, [])
+
+    def test_matches_reference_for_other_input_types(self):
+        """Test floats, ints and strings of the same rate share cached factors without changing results"""
+        from .utils import calculate_monthly_installment
+        for amount, rate, tenure in [
+            (100000, 12.5, 12), (100000, Decimal('12.50'), 12), (100000, '12.5', 12),
+            (50000, 12, 6), (50000, Decimal('12.00'), 6), (250000.75, 10.1, 24), (250000.75, Decimal('10.1'), 24),
+            (100000, 0, 12), (Decimal('100000.00'), Decimal('0.00'), 7),
+        ]:
+            with self.subTest(amount=amount, rate=rate, tenure=tenure):
+                expected = reference_monthly_installment(amount, rate, tenure)
+                actual = calculate_monthly_installment(amount, rate, tenure)
+                self.assertEqual(actual, expected)
+                self.assertEqual(actual.as_tuple().exponent, expected.as_tuple().exponent)
+
+    def test_factor_cache_is_bounded(self):
+        """Test the EMI factor cache holds a bounded number of (rate, tenure) pairs"""
+        from .utils import EMI_FACTOR_CACHE_SIZE, _annuity_factors, calculate_monthly_installment
+        for tenure in range(1, EMI_FACTOR_CACHE_SIZE + 10):
+            calculate_monthly_installment(1000, Decimal('11.11'), tenure)
+        self.assertEqual(_annuity_factors.cache_info().currsize, EMI_FACTOR_CACHE_SIZE)
+
+
+@skipUnless(len(settings.LOAN_SHARDS) > 1, 'Set LOAN_SHARDS to two or more database URLs to run the sharding tests')
+@override_settings(DECISION_LOG_WRITE_BEHIND=False)
+class ShardingTests(APITestCase):
+    databases = '__all__'
+
+    def register(self, first_name, last_name='Doe', monthly_salary=100000):
+        response = self.client.post(reverse('register'), {
+            'first_name': first_name,
+            'last_name': last_name,
+            'age': 30,
+            'monthly_salary': monthly_salary,
+            'phone_number': '9876543210',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['customer_id']
+
+    def shards_holding(self, model, **lookup):
+        from .sharding import shard_aliases
+        return [alias for alias in shard_aliases() if model.objects.using(alias).filter(**lookup).exists()]
+
+    def test_customers_and_loans_live_on_their_shard(self):
+        """Test registration and loan creation write to the customer's shard with globally unique IDs"""
+        from .models import EmiObligation
+        from .sharding import shard_aliases, shard_for_customer
+        customer_ids = [self.register(name) for name in ('Ann', 'Bob', 'Cid', 'Dee')]
+        self.assertEqual(len(set(customer_ids)), 4)
+        self.assertEqual(
+            {shard_for_customer(customer_id) for customer_id in customer_ids},
+            set(shard_aliases()[:4])
+        )
+        for customer_id in customer_ids:
+            self.assertEqual(self.shards_holding(Customer, customer_id=customer_id), [shard_for_customer(customer_id)])
+
+        loan_ids = []
+        for customer_id in customer_ids:
+            data = {'customer_id': customer_id, 'loan_amount': 100000, 'interest_rate': 12.5, 'tenure': 12}
+            response = self.client.post(reverse('check-eligibility'), data, format='json')
+            self.assertTrue(response.data['approval'])
+            response = self.client.post(reverse('create-loan'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            loan_ids.append(response.data['loan_id'])
+            self.assertEqual(self.shards_holding(Loan, loan_id=response.data['loan_id']), [shard_for_customer(customer_id)])
+            self.assertEqual(self.shards_holding(EmiObligation, customer_id=customer_id), [shard_for_customer(customer_id)])
+        self.assertEqual(len(set(loan_ids)), 4)
+        self.assertEqual(DecisionLog.objects.using('default').count(), 8)
+
+        for customer_id, loan_id in zip(customer_ids, loan_ids):
+            response = self.client.get(reverse('view-loan', args=[loan_id]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['customer']['customer_id'], customer_id)
+            response = self.client.get(reverse('view-loans', args=[customer_id]))
+            self.assertEqual([loan['loan_id'] for loan in response.data], [loan_id])
+        self.assertEqual(self.client.get(reverse('view-loan', args=[max(loan_ids) + 1])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('view-loans', args=[max(customer_ids) + 1])).status_code, 404)
+
+    def test_batch_registration_spreads_across_shards(self):
+        """Test bulk registration allocates IDs once and writes each customer to its shard"""
+        from .sharding import shard_for_customer
+        rows = [
+            {'first_name': f'C{index}', 'last_name': 'Doe', 'age': 30, 'monthly_salary': 50000, 'phone_number': '9000000000'}
+            for index in range(6)
+        ]
+        response = self.client.post(reverse('register-batch'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        customer_ids = response.data['customer_ids']
+        self.assertEqual(customer_ids, list(range(customer_ids[0], customer_ids[0] + 6)))
+        for customer_id in customer_ids:
+            self.assertEqual(self.shards_holding(Customer, customer_id=customer_id), [shard_for_customer(customer_id)])
+        self.assertEqual(self.register('Next'), customer_ids[-1] + 1)
+
+    def test_batch_registration_is_all_or_nothing(self):
+        """Test a shard failing during bulk registration rolls back the shards written before it"""
+        from unittest import mock
+        from django.db import OperationalError
+        from django.db.models.query import QuerySet
+        from .onboarding import bulk_register_customers
+        rows = [
+            {'first_name': f'C{index}', 'last_name': 'Doe', 'age': 30, 'monthly_salary': 50000, 'phone_number': '9000000000'}
+            for index in range(6)
+        ]
+        bulk_create = QuerySet.bulk_create
+        calls = []
+
+        def fail_on_second_shard(queryset, objs, *args, **kwargs):
+            calls.append(queryset.db)
+            if len(calls) == 2:
+                raise OperationalError('shard unavailable')
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', fail_on_second_shard):
+            with self.assertRaises(OperationalError):
+                bulk_register_customers(rows)
+        self.assertEqual(count_on_shards(Customer), 0)
+
+    def test_search_and_export_gather_every_shard(self):
+        """Test search pages and the export merge results from all shards in order"""
+        for name in ('Ann', 'Bob', 'Cid', 'Dee', 'Eve'):
+            customer_id = self.register(name, last_name='Smith')
+            self.client.post(reverse('create-loan'), {
+                'customer_id': customer_id, 'loan_amount': 100000, 'interest_rate': 12.5, 'tenure': 12
+            }, format='json')
+
+        response = self.client.get(reverse('customer-search'), {'name': 'smith', 'page_size': 2, 'page': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([customer['name'] for customer in response.data['results']], ['Cid Smith', 'Dee Smith'])
+
+        response = self.client.get(reverse('export-loans'), {'export_format': 'ndjson'})
+        import json
+        loan_ids = [json.loads(line)['loan_id'] for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(loan_ids), 5)
+        self.assertEqual(loan_ids, sorted(loan_ids))
+
+    def test_ingest_routes_rows_to_shards(self):
+        """Test the initial data load writes customers and loans to their shards and moves the ID counters past them"""
+        import os
+        import tempfile
+        from pathlib import Path
+        import pandas as pd
+        from .sharding import shard_for_customer
+        from .tasks import load_initial_data
+        with tempfile.TemporaryDirectory() as tempdir:
+            os.makedirs(os.path.join(tempdir, 'data'))
+            pd.DataFrame({
+                'Customer ID': [1, 2, 3, 4],
+                'First Name': ['A', 'B', 'C', 'D'],
+                'Last Name': ['X', 'Y', 'Z', 'X'],
+                'Age': [30, 40, 50, 35],
+                'Phone Number': [9000000001, 9000000002, 9000000003, 9000000004],
+                'Monthly Salary': [50000, 60000, 70000, 80000],
+                'Approved Limit': [1800000, 2200000, 2600000, 2900000],
+            }).to_excel(os.path.join(tempdir, 'data', 'customer_data.xlsx'), index=False)
+            pd.DataFrame({
+                'Customer ID': [1, 2, 3, 4],
+                'Loan ID': [11, 12, 13, 14],
+                'Loan Amount': [100000, 200000, 300000, 400000],
+                'Tenure': [12, 24, 36, 48],
+                'Interest Rate': [10.5, 11.0, 12.0, 13.0],
+                'Monthly payment': [8815, 9321, 9964, 10731],
+                'EMIs paid on Time': [12, 20, 30, 10],
+                'Date of Approval': pd.to_datetime(['2020-01-01'] * 4),
+                'End Date': pd.to_datetime(['2021-01-01', '2022-01-01', '2023-01-01', '2024-01-01']),
+            }).to_excel(os.path.join(tempdir, 'data', 'loan_data.xlsx'), index=False)
+            with override_settings(BASE_DIR=Path(tempdir), INGEST_CHUNK_SIZE=3):
+                load_initial_data(inline=True)
+
+        for customer_id, loan_id in zip([1, 2, 3, 4], [11, 12, 13, 14]):
+            self.assertEqual(self.shards_holding(Customer, customer_id=customer_id), [shard_for_customer(customer_id)])
+            self.assertEqual(self.shards_holding(Loan, loan_id=loan_id), [shard_for_customer(customer_id)])
+        self.assertEqual(self.register('New'), 5)
+
+    def test_scatter_gather_reports(self):
+        """Test cross-shard helpers see every shard"""
+        from .simulation import load_credit_profiles
+        from .sharding import highest_id, scatter, shard_aliases
+        customer_ids = [self.register(name) for name in ('Ann', 'Bob', 'Cid')]
+        self.assertEqual(sum(scatter(lambda alias: Customer.objects.using(alias).count())), 3)
+        self.assertEqual(len(scatter(lambda alias: alias)), len(shard_aliases()))
+        self.assertEqual(highest_id(Customer), max(customer_ids))
+        self.assertEqual(list(load_credit_profiles().customer_id), customer_ids)
+
+    def test_shard_strategies(self):
+        """Test modulo and range customer ID to shard mapping"""
+        from .sharding import shard_aliases, shard_for_customer
+        aliases = shard_aliases()
+        self.assertEqual([shard_for_customer(customer_id) for customer_id in range(len(aliases))], aliases)
+        with override_settings(LOAN_SHARD_STRATEGY='range', LOAN_SHARD_RANGE_SIZE=10):
+            self.assertEqual(shard_for_customer(1), aliases[0])
+            self.assertEqual(shard_for_customer(10), aliases[0])
+            self.assertEqual(shard_for_customer(11), aliases[1])
+            self.assertEqual(shard_for_customer(10 * len(aliases) + 500), aliases[-1])
+
+    def test_customer_tables_only_exist_on_shards(self):
+        """Test the router keeps customers and loans off the default database and the rest off the shards"""
+        from django.db import connections
+        from .sharding import shard_aliases
+        self.assertNotIn(Customer._meta.db_table, connections['default'].introspection.table_names())
+        for alias in shard_aliases():
+            tables = connections[alias].introspection.table_names()
+            self.assertIn(Loan._meta.db_table, tables)
+            self.assertNotIn(DecisionLog._meta.db_table, tables)
+
+
+@override_settings(REQUEST_PROFILING=True, DECISION_LOG_WRITE_BEHIND=False)
+class RequestProfilingTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        profiling_dir = override_settings(REQUEST_PROFILING_DIR=self.tempdir.name)
+        profiling_dir.enable()
+        self.addCleanup(profiling_dir.disable)
+        self.customer = Customer.objects.create(
+            first_name='John',
+            last_name='Doe',
+            age=30,
+            monthly_salary=50000,
+            phone_number='1234567890',
+            approved_limit=1800000
+        )
+
+    def check_eligibility(self, **headers):
+        return self.client.post(reverse('check-eligibility'), {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 12.5,
+            'tenure': 12
+        }, format='json', **headers)
+
+    def test_signed_header_profiles_request(self):
+        """Test a request with a valid signed token is profiled with SQL timeline and tracked function times"""
+        from .profiling import make_profiling_token, profile_store
+        response = self.check_eligibility(HTTP_X_PROFILE_REQUEST=make_profiling_token())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = profile_store().get(response['X-Profile-Id'])
+        self.assertEqual(profile['trigger'], 'header')
+        self.assertEqual(profile['path'], reverse('check-eligibility'))
+        self.assertEqual(profile['functions']['calculate_credit_score']['calls'], 1)
+        self.assertEqual(profile['functions']['calculate_monthly_installment']['calls'], 1)
+        self.assertGreater(profile['sql']['count'], 0)
+        self.assertEqual(len(profile['sql']['timeline']), profile['sql']['count'])
+        self.assertTrue(profile['profile'])
+
+    def test_busy_deterministic_profiler_falls_back_to_sampling(self):
+        """Test a request profiled while cProfile is already active elsewhere is sampled instead of failing"""
+        from unittest import mock
+        from .profiling import DeterministicProfiler, make_profiling_token, profile_store
+        busy = ValueError('Another profiling tool is already active')
+        with mock.patch.object(DeterministicProfiler, 'enable', side_effect=busy):
+            response = self.check_eligibility(HTTP_X_PROFILE_REQUEST=make_profiling_token())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(profile_store().get(response['X-Profile-Id'])['mode'], 'sampling')
+
+    def test_unsigned_requests_are_not_profiled(self):
+        """Test requests without a valid token are not profiled when sampling is off"""
+        from .profiling import profile_store
+        self.assertNotIn('X-Profile-Id', self.check_eligibility())
+        self.assertNotIn('X-Profile-Id', self.check_eligibility(HTTP_X_PROFILE_REQUEST='profile:forged:token'))
+        self.assertEqual(profile_store().list(), [])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_MODE='sampling',
+                       REQUEST_PROFILING_SAMPLE_INTERVAL=0.0005, REQUEST_PROFILING_MAX_PROFILES=2)
+    def test_sampled_profiles_are_kept_in_ring_buffer(self):
+        """Test sampled requests are profiled by the stack sampler and only the newest profiles are kept"""
+        from .profiling import profile_store
+        profile_ids = [self.check_eligibility()['X-Profile-Id'] for _ in range(3)]
+        summaries = profile_store().list()
+        self.assertEqual([summary['id'] for summary in summaries], profile_ids[:0:-1])
+        self.assertEqual(summaries[0]['trigger'], 'sample')
+        self.assertEqual(summaries[0]['mode'], 'sampling')
+        self.assertIsNone(profile_store().get(profile_ids[0]))
+
+    def test_profile_endpoints_are_admin_only(self):
+        """Test stored profiles can only be listed and read by admin users"""
+        from django.contrib.auth.models import User
+        from .profiling import make_profiling_token
+        profile_id = self.check_eligibility(HTTP_X_PROFILE_REQUEST=make_profiling_token())['X-Profile-Id']
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user('staff', password='password'))
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('profiles'))
+        self.assertEqual([summary['id'] for summary in response.data], [profile_id])
+        response = self.client.get(reverse('profile-detail', args=[profile_id]))
+        self.assertEqual(response.data['id'], profile_id)
+        response = self.client.get(reverse('profile-detail', args=['..%2Fsettings']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_are_admin_only(self):
+        """Test the coalescing and decision log buffer counters are only served to admins"""
+        from django.contrib.auth.models import User
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['credit_profiles']), {'computations', 'coalesced', 'remote_hits', 'remote_errors', 'saved'})
+        for backpressure in ('buffered', 'high_water_mark', 'dropped', 'failed_flushes', 'backpressure_flushes'):
+            self.assertIn(backpressure, response.data['decision_log'])
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled_middleware_is_not_used(self):
+        """Test the profiling middleware removes itself from the chain when profiling is off"""
+        from django.core.exceptions import MiddlewareNotUsed
+        from .middleware import RequestProfilingMiddleware
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(lambda request: None)
+
+
+@override_settings(DECISION_LOG_WRITE_BEHIND=False)
+class EmiObligationTests(APITestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='John',
+            last_name='Doe',
+            age=30,
+            monthly_salary=50000,
+            phone_number='1234567890',
+            approved_limit=1800000
+        )
+        self.this_month = date.today().replace(day=1)
+
+    def create_loan(self, months_from_now, tenure=12, loan_amount=100000):
+        from dateutil.relativedelta import relativedelta
+        return Loan.objects.create(
+            customer=self.customer,
+            loan_amount=loan_amount,
+            tenure=tenure,
+            interest_rate=10,
+            monthly_repayment=0,
+            start_date=date.today() + relativedelta(months=months_from_now),
+            end_date=date.today(),
+            repayments_left=tenure
+        )
+
+    def timeline(self):
+        return {
+            (month.year - self.this_month.year) * 12 + month.month - self.this_month.month: total_emi
+            for month, total_emi in self.customer.emi_obligations.values_list('month', 'total_emi')
+        }
+
+    def test_loans_maintain_timeline(self):
+        """Test creating and deleting loans adds and removes their EMI from the months it falls due in"""
+        current = self.create_loan(0)
+        future = self.create_loan(6)
+        self.create_loan(-24)
+        expected = {offset: current.monthly_repayment for offset in range(1, 13)}
+        for offset in range(7, 19):
+            expected[offset] = expected.get(offset, 0) + future.monthly_repayment
+        self.assertEqual(self.timeline(), expected)
+
+        current.delete()
+        self.assertEqual(self.timeline(), {offset: future.monthly_repayment for offset in range(7, 19)})
+
+    def test_eligibility_checks_peak_over_new_loan_tenure(self):
+        """Test a loan starting after the requested tenure does not count against it, but one inside it does"""
+        self.create_loan(12, tenure=24, loan_amount=400000)
+        request = {'customer_id': self.customer.customer_id, 'loan_amount': 150000, 'interest_rate': 12}
+        response = self.client.post(reverse('check-eligibility'), dict(request, tenure=9), format='json')
+        self.assertTrue(response.data['approval'])
+        response = self.client.post(reverse('check-eligibility'), dict(request, tenure=24), format='json')
+        self.assertFalse(response.data['approval'])
+
+    def test_loan_paid_off_this_month_does_not_block_eligibility(self):
+        """Test the last EMI of a loan, due earlier this month, does not count against a new loan"""
+        loan = Loan.objects.create(
+            customer=self.customer,
+            loan_amount=300000,
+            tenure=12,
+            interest_rate=10,
+            monthly_repayment=0,
+            start_date=date(self.this_month.year - 1, self.this_month.month, 1),
+            end_date=self.this_month,
+            repayments_left=0
+        )
+        self.assertGreater(loan.monthly_repayment, self.customer.monthly_salary / 2)
+        self.assertEqual(self.timeline(), {0: loan.monthly_repayment})
+        request = {'customer_id': self.customer.customer_id, 'loan_amount': 10000, 'interest_rate': 12, 'tenure': 12}
+        response = self.client.post(reverse('check-eligibility'), request, format='json')
+        self.assertTrue(response.data['approval'])
+
+    def test_rebuild_command_restores_timeline(self):
+        """Test the rebuild command recomputes timelines of bulk-loaded loans and drops past months"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import EmiObligation
+        loan = self.create_loan(0)
+        expected = self.timeline()
+        self.customer.emi_obligations.all().delete()
+        EmiObligation.objects.using(self.customer._state.db).create(customer=self.customer, month=date(2000, 1, 1), total_emi=1)
+        call_command('rebuild_emi_obligations', stdout=StringIO())
+        self.assertEqual(self.timeline(), expected)
+        self.assertEqual(len(expected), loan.tenure)
+
+    def test_coalesced_profile_round_trips_timeline(self):
+        """Test credit profiles shared through Redis keep their obligation timeline"""
+        from .coalescing import _dump_credit_profile, _load_credit_profile
+        from .utils import get_credit_profile
+        self.create_loan(2)
+        profile = get_credit_profile(self.customer)
+        self.assertEqual(profile[1][:2], [Decimal('0'), Decimal('0')])
+        self.assertEqual(_load_credit_profile(_dump_credit_profile(profile)), profile)
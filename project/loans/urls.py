@@ -1,16 +1,30 @@
 from django.urls import path
 from .views import (
     CustomerRegistrationView,
+    CustomerBatchRegistrationView,
     LoanEligibilityView,
     LoanCreationView,
     LoanDetailView,
-    CustomerLoansView
+    CustomerLoansView,
+    IngestStatusView,
+    LoanExportView,
+    CustomerSearchView,
+    ProfileListView,
+    ProfileDetailView,
+    MetricsView
 )
 
 urlpatterns = [
     path('register', CustomerRegistrationView.as_view(), name='register'),
+    path('register/batch', CustomerBatchRegistrationView.as_view(), name='register-batch'),
     path('check-eligibility', LoanEligibilityView.as_view(), name='check-eligibility'),
     path('create-loan', LoanCreationView.as_view(), name='create-loan'),
     path('view-loan/<int:loan_id>', LoanDetailView.as_view(), name='view-loan'),
     path('view-loans/<int:customer_id>', CustomerLoansView.as_view(), name='view-loans'),
+    path('ingest/status', IngestStatusView.as_view(), name='ingest-status'),
+    path('export/loans', LoanExportView.as_view(), name='export-loans'),
+    path('customers/search', CustomerSearchView.as_view(), name='customer-search'),
+    path('profiles', ProfileListView.as_view(), name='profiles'),
+    path('profiles/<str:profile_id>', ProfileDetailView.as_view(), name='profile-detail'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
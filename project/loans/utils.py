@@ -1,8 +1,38 @@
 import math
 from decimal import Decimal
+from functools import lru_cache
 from datetime import datetime, date
 from django.db.models import Sum, Q
-from .models import Loan
+from .obligations import emi_timeline, peak_emi
+
+
+# Eligibility policy. Scores above APPROVAL_SCORE_THRESHOLD keep the requested
+# rate; each (lower_bound, minimum_rate) band approves scores above lower_bound
+# with the rate raised to at least minimum_rate; anything lower is rejected.
+APPROVAL_SCORE_THRESHOLD = 50
+RATE_FLOOR_BANDS = (
+    (30, Decimal('12.0')),
+    (10, Decimal('16.0')),
+)
+MAX_EMI_TO_SALARY_RATIO = Decimal('0.5')
+
+# Distinct (interest rate, tenure) pairs whose EMI factors are kept in memory
+EMI_FACTOR_CACHE_SIZE = 4096
+
+
+def year_overlap_q(year):
+    """
+    Loans that start or end in the given year, as plain date ranges rather than
+    __year lookups so indexes apply. A loan ending in the year also started
+    before the year was out, so start_date < next year holds for both branches;
+    stating it lets PostgreSQL prune the start_date partitions of later years
+    (earlier years are still scanned for the loans ending in this one).
+    """
+    year_start, next_year_start = date(year, 1, 1), date(year + 1, 1, 1)
+    return Q(start_date__lt=next_year_start) & (
+        Q(start_date__gte=year_start) |
+        Q(end_date__gte=year_start, end_date__lt=next_year_start)
+    )
 
 
 def calculate_credit_score(customer):
@@ -16,7 +46,7 @@ def calculate_credit_score(customer):
     4. Loan approved volume
     5. Current loans > approved limit
     """
-    loans = Loan.objects.filter(customer=customer)
+    loans = customer.loans.all()
     
     # If no loan history, assign a default moderate score
     if not loans.exists():
@@ -37,9 +67,7 @@ def calculate_credit_score(customer):
     # Component 3: Loan activity in current year (20 points)
     # Recent activity shows current creditworthiness
     current_year = datetime.now().year
-    current_year_loans = loans.filter(
-        Q(start_date__year=current_year) | Q(end_date__year=current_year)
-    )
+    current_year_loans = loans.filter(year_overlap_q(current_year))
     current_year_score = min(20, current_year_loans.count() * 5)
     
     # Component 4: Loan approved volume (20 points)
@@ -71,6 +99,17 @@ def calculate_credit_score(customer):
     return credit_score
 
 
+@lru_cache(maxsize=EMI_FACTOR_CACHE_SIZE)
+def _annuity_factors(interest_rate, tenure):
+    """
+    The loan-amount independent parts of the EMI formula for a (rate, tenure)
+    pair: the monthly rate r, (1 + r)^n and (1 + r)^n - 1.
+    """
+    monthly_rate = interest_rate / Decimal('100') / Decimal('12')
+    growth = (1 + monthly_rate) ** tenure
+    return monthly_rate, growth, growth - 1
+
+
 def calculate_monthly_installment(loan_amount, interest_rate, tenure):
     """
     Calculate monthly installment using compound interest formula.
@@ -83,19 +122,21 @@ def calculate_monthly_installment(loan_amount, interest_rate, tenure):
     Returns:
         Monthly installment amount (decimal)
     """
-    # Convert annual interest rate to monthly decimal rate
-    monthly_rate = Decimal(interest_rate) / Decimal('100') / Decimal('12')
+    # Convert annual interest rate to decimal (the monthly rate comes from _annuity_factors)
+    interest_rate = Decimal(interest_rate)
     
     # Convert loan amount to decimal if it's not already
     loan_amount = Decimal(loan_amount)
     
     # Calculate using compound interest formula: P * r * (1 + r)^n / ((1 + r)^n - 1)
-    if monthly_rate == 0:
+    if interest_rate == 0:
         # If interest rate is 0, simply divide loan amount by tenure
         return loan_amount / Decimal(tenure)
     
-    numerator = loan_amount * monthly_rate * (1 + monthly_rate) ** tenure
-    denominator = (1 + monthly_rate) ** tenure - 1
+    # The factors are cached per (rate, tenure); the operations that involve the
+    # loan amount keep their original order so every intermediate rounds the same way
+    monthly_rate, growth, denominator = _annuity_factors(interest_rate, tenure)
+    numerator = loan_amount * monthly_rate * growth
     
     monthly_installment = numerator / denominator
     
@@ -103,51 +144,51 @@ def calculate_monthly_installment(loan_amount, interest_rate, tenure):
     return monthly_installment.quantize(Decimal('0.01'))
 
 
-def determine_loan_eligibility(customer, loan_amount, interest_rate, tenure):
+def get_credit_profile(customer):
+    """
+    Compute the inputs of an eligibility decision that depend only on the customer.
+    
+    Returns:
+        tuple: (credit_score, EMI obligation timeline from this month on, see obligations.emi_timeline)
+    """
+    return calculate_credit_score(customer), emi_timeline(customer)
+
+
+def determine_loan_eligibility(customer, loan_amount, interest_rate, tenure, credit_profile=None):
     """
     Determine if a customer is eligible for a loan based on credit score and other factors.
     
+    Args:
+        credit_profile: optional (credit_score, emi_timeline) tuple from get_credit_profile,
+            e.g. one shared by coalesced concurrent requests
+    
     Returns:
         tuple: (approval, corrected_interest_rate, monthly_installment)
     """
-    # Calculate credit score
-    credit_score = calculate_credit_score(customer)
-    
-    # Calculate total EMIs of current loans
-    current_loans = Loan.objects.filter(
-        customer=customer, 
-        end_date__gte=date.today()
-    )
-    total_emi = current_loans.aggregate(Sum('monthly_repayment'))['monthly_repayment__sum'] or Decimal('0')
+    # Calculate credit score and the EMIs owed in each coming month
+    credit_score, timeline = credit_profile or get_credit_profile(customer)
     
     # Calculate monthly installment
     monthly_installment = calculate_monthly_installment(loan_amount, interest_rate, tenure)
     
-    # Check if sum of all current EMIs > 50% of monthly salary
-    if total_emi + monthly_installment > (Decimal(customer.monthly_salary) * Decimal('0.5')):
+    # Check if the highest EMI total in any month of the new loan's tenure > 50% of monthly salary
+    total_emi = peak_emi(timeline, tenure)
+    if total_emi + monthly_installment > (Decimal(customer.monthly_salary) * MAX_EMI_TO_SALARY_RATIO):
         return False, interest_rate, monthly_installment
     
     # Determine approval and corrected interest rate based on credit score
-    if credit_score > 50:
+    if credit_score > APPROVAL_SCORE_THRESHOLD:
         # Approve loan with original interest rate
         return True, interest_rate, monthly_installment
     
-    elif 30 < credit_score <= 50:
-        # Approve loan but ensure interest rate >= 12%
-        corrected_rate = max(Decimal('12.0'), Decimal(interest_rate))
-        if corrected_rate > interest_rate:
-            # Recalculate monthly installment with corrected rate
-            monthly_installment = calculate_monthly_installment(loan_amount, corrected_rate, tenure)
-        return True, corrected_rate, monthly_installment
-    
-    elif 10 < credit_score <= 30:
-        # Approve loan but ensure interest rate >= 16%
-        corrected_rate = max(Decimal('16.0'), Decimal(interest_rate))
-        if corrected_rate > interest_rate:
-            # Recalculate monthly installment with corrected rate
-            monthly_installment = calculate_monthly_installment(loan_amount, corrected_rate, tenure)
-        return True, corrected_rate, monthly_installment
-    
-    else:
-        # Don't approve any loans
-        return False, interest_rate, monthly_installment
\ No newline at end of file
+    for lower_bound, minimum_rate in RATE_FLOOR_BANDS:
+        if credit_score > lower_bound:
+            # Approve loan but ensure interest rate >= the band's minimum rate
+            corrected_rate = max(minimum_rate, Decimal(interest_rate))
+            if corrected_rate > interest_rate:
+                # Recalculate monthly installment with corrected rate
+                monthly_installment = calculate_monthly_installment(loan_amount, corrected_rate, tenure)
+            return True, corrected_rate, monthly_installment
+    
+    # Don't approve any loans
+    return False, interest_rate, monthly_installment
@@ -1,10 +1,16 @@
+import os
 from rest_framework import status
 from rest_framework.views import APIView
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from datetime import date, timedelta
 from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Customer, Loan
+from .models import Customer, Loan, DecisionLog
 from .serializers import (
     CustomerRegistrationSerializer,
     CustomerResponseSerializer,
@@ -13,9 +19,19 @@ from .serializers import (
     LoanCreationRequestSerializer,
     LoanCreationResponseSerializer,
     LoanDetailSerializer,
-    LoanListSerializer
+    LoanListSerializer,
+    LoanExportQuerySerializer,
+    CustomerSearchQuerySerializer
 )
 from .utils import calculate_credit_score, calculate_monthly_installment, determine_loan_eligibility
+from .onboarding import bulk_register_customers, parse_csv_rows
+from .audit import decision_log, record_decision
+from .coalescing import credit_profiles, get_coalesced_credit_profile
+from .ingest import INITIAL_DATA_JOB, ingest_progress
+from .export import EXPORT_CONTENT_TYPES, stream_loans
+from .search import search_by_name, search_by_phone
+from .sharding import assign_global_ids, get_from_shards, shard_for_customer
+from .profiling import profile_store
 
 
 class CustomerRegistrationView(APIView):
@@ -31,6 +47,42 @@ class CustomerRegistrationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CustomerBatchRegistrationView(APIView):
+    """
+    API endpoint for bulk customer registration from a JSON list or CSV upload.
+    """
+    def post(self, request, *args, **kwargs):
+        if 'file' in request.FILES:
+            try:
+                rows = parse_csv_rows(request.FILES['file'])
+            except ValueError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            rows = request.data.get('customers')
+
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {'error': 'Expected a non-empty list of customers or a CSV file upload.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > settings.BULK_REGISTRATION_MAX_ROWS:
+            return Response(
+                {'error': f'A batch may contain at most {settings.BULK_REGISTRATION_MAX_ROWS} customers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        customer_ids, errors = bulk_register_customers(rows)
+        created = sum(1 for customer_id in customer_ids if customer_id is not None)
+        response_data = {
+            'created': created,
+            'customer_ids': customer_ids,
+            'errors': errors
+        }
+        return Response(response_data, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
 class LoanEligibilityView(APIView):
     """
     API endpoint to check loan eligibility.
@@ -41,16 +93,29 @@ class LoanEligibilityView(APIView):
             data = serializer.validated_data
             
             try:
-                customer = Customer.objects.get(customer_id=data['customer_id'])
+                customer = Customer.objects.using(shard_for_customer(data['customer_id'])).get(
+                    customer_id=data['customer_id']
+                )
             except Customer.DoesNotExist:
                 return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
             
-            # Determine loan eligibility
+            # Determine loan eligibility, sharing the credit profile with concurrent checks for this customer
             approval, corrected_interest_rate, monthly_installment = determine_loan_eligibility(
                 customer, 
                 data['loan_amount'], 
                 data['interest_rate'], 
-                data['tenure']
+                data['tenure'],
+                credit_profile=get_coalesced_credit_profile(customer)
+            )
+            record_decision(
+                DecisionLog.ELIGIBILITY_CHECK,
+                customer.customer_id,
+                data['loan_amount'],
+                data['interest_rate'],
+                corrected_interest_rate,
+                data['tenure'],
+                monthly_installment,
+                approval
             )
             
             response_data = {
@@ -80,7 +145,9 @@ class LoanCreationView(APIView):
             data = serializer.validated_data
             
             try:
-                customer = Customer.objects.get(customer_id=data['customer_id'])
+                customer = Customer.objects.using(shard_for_customer(data['customer_id'])).get(
+                    customer_id=data['customer_id']
+                )
             except Customer.DoesNotExist:
                 return Response({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
             
@@ -107,7 +174,7 @@ class LoanCreationView(APIView):
                 start_date = date.today()
                 end_date = start_date + timedelta(days=30 * data['tenure'])
                 
-                loan = Loan.objects.create(
+                loan = Loan(
                     customer=customer,
                     loan_amount=data['loan_amount'],
                     interest_rate=corrected_interest_rate,
@@ -117,13 +184,30 @@ class LoanCreationView(APIView):
                     end_date=end_date,
                     repayments_left=data['tenure']
                 )
+                assign_global_ids(Loan, [loan])
+                # The loan, its EMI timeline (post_save) and the customer's
+                # debt commit together, on the customer's shard when sharded
+                with transaction.atomic(using=customer._state.db):
+                    loan.save(force_insert=True, using=customer._state.db)
+                    
+                    # Update customer's current debt
+                    customer.current_debt += Decimal(data['loan_amount'])
+                    customer.save()
                 
                 response_data['loan_approved'] = True
                 response_data['loan_id'] = loan.loan_id
-                
-                # Update customer's current debt
-                customer.current_debt += Decimal(data['loan_amount'])
-                customer.save()
+            
+            record_decision(
+                DecisionLog.LOAN_CREATION,
+                customer.customer_id,
+                data['loan_amount'],
+                data['interest_rate'],
+                corrected_interest_rate,
+                data['tenure'],
+                monthly_installment,
+                approval,
+                loan_id=response_data['loan_id']
+            )
             
             response_serializer = LoanCreationResponseSerializer(data=response_data)
             if response_serializer.is_valid():
@@ -138,7 +222,11 @@ class LoanDetailView(APIView):
     API endpoint to view loan details by loan_id.
     """
     def get(self, request, loan_id, *args, **kwargs):
-        loan = get_object_or_404(Loan, loan_id=loan_id)
+        # Loans are looked up on every shard; their IDs are globally unique
+        try:
+            loan = get_from_shards(Loan.objects.select_related('customer'), loan_id=loan_id)
+        except Loan.DoesNotExist:
+            raise Http404
         serializer = LoanDetailSerializer(loan)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -149,13 +237,102 @@ class CustomerLoansView(APIView):
     """
     def get(self, request, customer_id, *args, **kwargs):
         # Check if customer exists
-        get_object_or_404(Customer, customer_id=customer_id)
+        shard = shard_for_customer(customer_id)
+        get_object_or_404(Customer.objects.using(shard), customer_id=customer_id)
         
         # Get all loans for the customer
-        loans = Loan.objects.filter(customer_id=customer_id)
-        
-        if not loans.exists():
-            return Response([], status=status.HTTP_200_OK)
-        
+        loans = Loan.objects.using(shard).filter(customer_id=customer_id)
         serializer = LoanListSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class IngestStatusView(APIView):
+    """
+    API endpoint to view the progress and ETA of a data ingest job.
+    """
+    def get(self, request, *args, **kwargs):
+        progress = ingest_progress(request.query_params.get('job', INITIAL_DATA_JOB))
+        if progress is None:
+            return Response({'error': 'Ingest job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(progress, status=status.HTTP_200_OK)
+
+
+class LoanExportView(APIView):
+    """
+    API endpoint to stream the loan book as CSV or newline-delimited JSON.
+    """
+    def get(self, request, *args, **kwargs):
+        serializer = LoanExportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        filters = dict(serializer.validated_data)
+        export_format = filters.pop('export_format')
+
+        response = StreamingHttpResponse(
+            stream_loans(export_format, **filters),
+            content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="loans.{export_format}"'
+        return response
+
+
+class CustomerSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CustomerSearchView(APIView):
+    """
+    API endpoint to find customers by exact phone number or by name.
+    """
+    def get(self, request, *args, **kwargs):
+        serializer = CustomerSearchQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if serializer.validated_data.get('phone_number'):
+            customers = search_by_phone(serializer.validated_data['phone_number'])
+        else:
+            customers = search_by_name(serializer.validated_data['name'])
+
+        paginator = CustomerSearchPagination()
+        page = paginator.paginate_queryset(customers, request, view=self)
+        return paginator.get_paginated_response(CustomerResponseSerializer(page, many=True).data)
+
+
+class ProfileListView(APIView):
+    """
+    API endpoint listing the stored request profiles, newest first (admins only).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(profile_store().list(), status=status.HTTP_200_OK)
+
+
+class ProfileDetailView(APIView):
+    """
+    API endpoint returning one stored request profile (admins only).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        profile = profile_store().get(profile_id)
+        if profile is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    API endpoint returning the in-process counters of the serving worker (admins only).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            'pid': os.getpid(),
+            'credit_profiles': credit_profiles.stats(),
+            'decision_log': decision_log.stats(),
+        }, status=status.HTTP_200_OK)